@@ -0,0 +1,72 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streams agent steps and answers to open Gradio pages without reloading."""
+
+import threading
+
+from smolagents.memory import ActionStep
+
+
+def format_step(step):
+    """Markdown of one agent step."""
+    text = f"### Step {step.step_number}\n"
+    if step.model_output:
+        text += f"{step.model_output.strip()}\n"
+    if step.observations:
+        text += f"```\n{step.observations.strip()}\n```\n"
+    if step.error is not None:
+        text += f"**Error:** {step.error}\n"
+    return text
+
+
+def run_agent_streaming(agent, task):
+    """
+    Runs the agent with `stream=True`.
+
+    Yields:
+        tuple: (markdown of the steps so far, final answer or None until the end).
+    """
+    steps_markdown = ""
+    for step in agent.run(task, stream=True):
+        if isinstance(step, ActionStep):
+            steps_markdown += format_step(step)
+            yield steps_markdown, None
+        else:
+            yield steps_markdown, step
+
+
+class AgentOutputBoard:
+    """
+    Latest issue and agent output,read by every open page.
+
+    `publish()` can be called from any thread(agent workers),pages poll
+    `snapshot()` with a `gr.Timer`,so no request stays open between updates.
+    """
+
+    def __init__(self, issue="", output=""):
+        self.issue = issue
+        self.output = output
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return self.issue, self.output
+
+    def publish(self, issue=None, output=None):
+        with self._lock:
+            if issue is not None:
+                self.issue = issue
+            if output is not None:
+                self.output = output
@@ -13,12 +13,23 @@
 # limitations under the License.
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import gradio as gr
 from smolagents import CodeAgent, tool
 
-from linear_api_utils import execute_query
-from sleep_per_last_token_model import SleepPerLastTokenModelLiteLLM
+from linear_api_utils import (
+    LinearMetadataCache,
+    MutationBatch,
+    fetch_todo_issues,
+    find_todo_issue,
+    get_state_id,
+    get_team_id,
+)
+from issue_advice_index import IssueAdviceIndex
+from agent_output_stream import run_agent_streaming
+from sleep_per_last_token_model import ResponseCache, SleepPerLastTokenModelLiteLLM
 
 # if use .env need these lines HF_TOKEN is optional
 """
@@ -55,6 +66,26 @@ def get_env_value(key, is_value_error_on_null=True):
 
 # SETTINGS
 LINEAR_ISSUE_LABEL = "huggingface-public"  # only show issue with this label,I added for demo you can remove this
+# fetch all priorities in one query,False for one query per priority
+BATCH_PRIORITY_QUERY = True
+METADATA_CACHE_TTL = 3600  # seconds,team and workflow state ids are cached
+# e.g. "linear_metadata.json" to keep the cache warm between restarts
+METADATA_SNAPSHOT_PATH = None
+PAGE_LOAD_CONCURRENCY = 4  # update_text calls running at the same time
+RESPONSE_CACHE_TTL = 3600  # seconds,identical model requests reuse the response
+# e.g. "response_cache.sqlite" to keep responses between restarts
+RESPONSE_CACHE_PATH = None
+# off by default,agent prompts stay unchanged
+# set "seed" to add the advice of a near-duplicate solved issue to the prompt,
+# or "return" to reuse it without running the agent
+ADVICE_INDEX_MODE = None
+ADVICE_SIMILARITY = 0.8  # estimated Jaccard similarity of a near-duplicate
+ADVICE_INDEX_MAX_ENTRIES = 1000  # solved issues kept in memory
+BATCH_MODE = False  # show the "Process Todo batch" button
+BATCH_SIZE = 5  # top Todo issues fetched by one batch
+BATCH_MAX_WORKERS = 2  # agents running at the same time in a batch
+# post comments and move issues to Reviewing in one request after a batch(If you duplicate space)
+BATCH_WRITE_BACK = False
 ## set secret key on Space setting or .env(local)
 # hf_token = get_env_value("HF_TOKEN")
 groq_api_key = get_env_value("GROQ_API_KEY")
@@ -69,6 +100,64 @@ if groq_api_key is None:
 
 model_id = "groq/llama3-8b-8192"
 
+metadata_cache = LinearMetadataCache(
+    ttl=METADATA_CACHE_TTL, snapshot_path=METADATA_SNAPSHOT_PATH
+)
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, sqlite_path=RESPONSE_CACHE_PATH)
+advice_index = IssueAdviceIndex(
+    threshold=ADVICE_SIMILARITY, max_entries=ADVICE_INDEX_MAX_ENTRIES
+)
+
+
+def comment_body(model_name, comment):
+    """
+    Comment text with the ai comment header.
+
+    Args:
+        model_name (str): Model name added as title.
+        comment (str): Comment text.
+
+    Returns:
+        str: comment body.
+    """
+    # header = f"<!---\n start-ai-comment({model_name}) \n--->\n"
+    header = f"[ ](start-ai-comment:{model_name})\n"
+    header += f"# {model_name.split('/')[1]}'s comment'\n"
+    return header + comment
+
+
+def write_back(team_id, advices, model_name=model_id):
+    """
+    Add the comments and change the states of issues to "Reviewing" in one request.
+
+    Args:
+        team_id (str): Team ID.
+        advices (list): (issue_id,comment) pairs.
+        model_name (str): Model name added as title.
+
+    Returns:
+        dict: issue_id -> list of errors,empty if everything succeeded.
+    """
+    # cached,only the first write back of a team queries workflowStates
+    state_id = get_state_id(team_id, "Reviewing", api_key, cache=metadata_cache)
+    batch = MutationBatch()
+    aliases = []
+    for issue_id, comment in advices:
+        aliases.append(
+            (issue_id, batch.add_comment(issue_id, comment_body(model_name, comment)))
+        )
+        if state_id is not None:
+            aliases.append((issue_id, batch.update_issue(issue_id, stateId=state_id)))
+    results = batch.execute(api_key)
+
+    errors = {issue_id: [] for issue_id, _ in advices}
+    for issue_id, alias in aliases:
+        errors[issue_id] += results[alias].errors
+    for issue_id, issue_errors in errors.items():
+        if issue_errors:
+            print(f"write back failed:{issue_id} {issue_errors}")
+    return errors
+
 
 def add_comment(issue_id, model_name, comment):
     """
@@ -82,134 +171,97 @@ def add_comment(issue_id, model_name, comment):
 
 
     Returns:
-        str: query result json.
+        MutationResult: data and errors of commentCreate.
     """
-    comment = comment.replace('"', '\\"').replace("\n", "\\n")  # escape doublequote
-    # header = f"<!---\\n start-ai-comment({model_name}) \\n--->\\n"
-    header = f"[ ](start-ai-comment:{model_name})\\n"
-    header += f"# {model_name.split('/')[1]}'s comment'\\n"
-    comment = header + comment
-    comment_create_text = """
-    mutation CommentCreate {
-  commentCreate(
-    input: {
-      issueId : "%s"
-      body:"%s" 
-    }
-  ) {
-    success
-    comment {
-      id
-      body
-    }
-  }
-}""" % (issue_id, comment)
-    result = execute_query("add comment", comment_create_text, api_key)
-
-
-issue_id = None
-
-
-def change_state_reviewing():
+    batch = MutationBatch()
+    alias = batch.add_comment(issue_id, comment_body(model_name, comment))
+    return batch.execute(api_key)[alias]
+
+
+def change_state_reviewing(team_id, issue_id):
     """
     Change the state of an issue to "Reviewing".
 
+    Args:
+        team_id (str): Team ID.
+        issue_id (str): Issue ID.
+
     Returns:
         None
     """
-    get_state_query_text = """
-    query Sate{
-    workflowStates(filter:{team:{id:{eq:"%s"}}}){
-        nodes{
-        id
-        name
-        }
-    }
-    }
-""" % (team_id)
-    result = execute_query("State", get_state_query_text, api_key)
-    state_id = None
-    for state in result["data"]["workflowStates"]["nodes"]:
-        if state["name"] == "Reviewing":
-            state_id = state["id"]
-            break
+    state_id = get_state_id(team_id, "Reviewing", api_key, cache=metadata_cache)
 
     if state_id is None:
         return
-    issue_update_text = """
-mutation IssueUpdate {
-  issueUpdate(
-    id: "%s",
-    input: {
-      stateId: "%s",
-    }
-  ) {
-    success
-    issue {
-      id
-      title
-      state {
-        id
-        name
-      }
-    }
-  }
-}
-""" % (issue_id, state_id)
-    result = execute_query("IssueUpdate", issue_update_text, api_key)
-
-
-@tool
-def get_todo_issue() -> str:
+    batch = MutationBatch()
+    batch.update_issue(issue_id, stateId=state_id)
+    batch.execute(api_key)
+
+
+class TodoRequest:
+    """
+    State of one update_text call(page load).
+    Concurrent page loads each get their own,instead of sharing module globals.
+
+    Args:
+        team_id (str): Team ID.
     """
-    Get the Todo issue.
+
+    def __init__(self, team_id):
+        self.team_id = team_id
+        self.fetched = False  # the Todo issue is fetched once per request
+        self.issue_id = None
+        self.issue_text = "No Issue Found"
+
+
+def make_get_todo_issue(request):
+    """
+    Build the get_todo_issue tool bound to a TodoRequest.
+
+    Args:
+        request (TodoRequest): State the tool reads and updates.
 
     Returns:
-        A string describing the current issue.
+        The get_todo_issue tool.
     """
-    global issue_id
-    global issue_text
-    priority_order = [1, 2, 3, 0, 4]
-    for priority in priority_order:
-        team_query_text = """
-        query Team {
-        team(id: "%s") {
-            id
-            issues(first:1,filter:{
-                state:{
-                    name:{ eq: "Todo" },
-                    }
-                priority:{eq:%d}
-            }) {
-            nodes {
-                id
-                title
-                description
-                createdAt
-            }
-            }
-        }
-        }
-        
-        """ % (team_id, priority)
-
-        result = execute_query("Team", team_query_text, api_key, True)
-        if len(result["data"]["team"]["issues"]["nodes"]) > 0:
-            issue = result["data"]["team"]["issues"]["nodes"][0]
-            issue_text = str(issue["title"])
-            issue_id = issue["id"]
-            description = issue.get("description", None)
-            if description is not None:
-                issue_text += "\n" + description
-            return issue_text
-
-    return "Not Todo issue found"
-
-
-def generate_agent():
+
+    @tool
+    def get_todo_issue() -> str:
+        """
+        Get the Todo issue.
+
+        Returns:
+            A string describing the current issue.
+        """
+        if not request.fetched:
+            issue = find_todo_issue(
+                request.team_id,
+                api_key,
+                batched=BATCH_PRIORITY_QUERY,
+            )
+            request.fetched = True
+            if issue is not None:
+                issue_text = str(issue["title"])
+                description = issue.get("description", None)
+                if description is not None:
+                    issue_text += "\n" + description
+                request.issue_id = issue["id"]
+                request.issue_text = issue_text
+        if request.issue_id is not None:
+            return request.issue_text
+
+        return "Not Todo issue found"
+
+    return get_todo_issue
+
+
+def generate_agent(tools):
     """
     Generate an agent.
 
+    Args:
+        tools (list): Tools of the agent.
+
     Returns:
         An agent.
     """
@@ -219,10 +271,11 @@ def generate_agent():
         model_id=model_id,
         api_base="https://api.groq.com/openai/v1/",
         api_key=groq_api_key,
+        response_cache=response_cache,
     )
     agent = CodeAgent(
         model=model,
-        tools=[get_todo_issue],  ## add your tools here (don't remove final answer)
+        tools=tools,  ## add your tools here (don't remove final answer)
         max_steps=1,
         verbosity_level=1,
         grammar=None,
@@ -233,60 +286,138 @@ def generate_agent():
     return agent
 
 
-team_id = None
-
-
 def update_text():
     """
     Get the Todo issue and generate an agent.
-    agent solve the issue and return text to Gradio outputs
+    agent solve the issue and stream text to Gradio outputs
 
-    Returns:
+    Yields:
         A string describing the current issue.
-        A string describing the agent advice.
+        A string describing the agent steps so far,then the agent advice.
     """
 
-    def get_team_id(team_name):
-        teams_text = """
-    query Teams {
-    teams {
-        nodes {
-        id
-        name
-        }
-    }
-    }
-    """
-        result = execute_query("Teams", teams_text, api_key)
-        for team in result["data"]["teams"]["nodes"]:
-            if team["name"] == team_name:
-                return team["id"]
-        return None
-
     team_name = "Agent"
-    global team_id
-    global issue_text
-    team_id = get_team_id(team_name)
+    team_id = get_team_id(team_name, api_key, cache=metadata_cache)
 
     if team_id is None:
-        return f"Team {team_name} is not found", "Team not found"
-    issue_text = "No Issue Found"
+        yield f"Team {team_name} is not found", "Team not found"
+        return
+    request = TodoRequest(team_id)
+    get_todo_issue = make_get_todo_issue(request)
     agent_text = "No Agent Advice"
 
-    agent = generate_agent()
-    agent_text = agent.run(
-        """
+    task = """
 First, get the Todo using the get_todo tool.
 Then, solve the Todo.
 Finally, return the result of solving the Todo.
         """
-    )
+    # show the issue first,the agent's own get_todo_issue call returns the same issue without a request
+    get_todo_issue()
+    yield request.issue_text, "Agent is thinking..."
+
+    advice_match = None
+    if ADVICE_INDEX_MODE is not None and request.issue_id is not None:
+        advice_match = advice_index.query(request.issue_text)
+    if advice_match is not None:
+        print(f"similar issue found({advice_match.similarity:.2f}):{advice_match.text}")
+        if ADVICE_INDEX_MODE == "return":
+            yield request.issue_text, advice_match.advice
+            return
+        task += f"\nA similar issue was solved before with this advice:\n{advice_match.advice}"
+
+    agent = generate_agent([get_todo_issue])
+    for steps_markdown, final_answer in run_agent_streaming(agent, task):
+        if final_answer is None:
+            yield request.issue_text, steps_markdown
+        else:
+            agent_text = str(final_answer)
+    if ADVICE_INDEX_MODE is not None and request.issue_id is not None:
+        advice_index.add(request.issue_text, agent_text)
 
     # If you duplicate space uncomment below
-    # add_comment(issue_id, model_id, agent_text)
-    # change_state_reviewing()
+    # write_back(request.team_id, [(request.issue_id, agent_text)])
+
+    yield request.issue_text, agent_text
+
+
+def issue_to_text(issue):
+    issue_text = str(issue["title"])
+    description = issue.get("description", None)
+    if description is not None:
+        issue_text += "\n" + description
+    return issue_text
 
-    return issue_text, agent_text
+
+def solve_issue(issue_text):
+    """
+    Run an agent without tools on one issue text.
+
+    Args:
+        issue_text (str): Issue title and description.
+
+    Returns:
+        str: The agent advice,None if the agent failed.
+    """
+    task = f"Solve this Todo issue and return the result.\n{issue_text}"
+    advice_match = None
+    if ADVICE_INDEX_MODE is not None:
+        advice_match = advice_index.query(issue_text)
+    if advice_match is not None:
+        if ADVICE_INDEX_MODE == "return":
+            return advice_match.advice
+        task += f"\nA similar issue was solved before with this advice:\n{advice_match.advice}"
+    try:
+        agent_text = str(generate_agent([]).run(task))
+    except Exception as e:
+        print(f"agent error:{e}")
+        return None
+    if ADVICE_INDEX_MODE is not None:
+        advice_index.add(issue_text, agent_text)
+    return agent_text
+
+
+def process_todo_batch():
+    """
+    Get the top BATCH_SIZE Todo issues in one query and solve them concurrently.
+    Comments and state changes are posted after every agent finished.
+
+    Returns:
+        str: Markdown of the issues,advice and throughput in issues per minute.
+    """
+    team_name = "Agent"
+    team_id = get_team_id(team_name, api_key, cache=metadata_cache)
+    if team_id is None:
+        return f"Team {team_name} is not found"
+
+    start = time.perf_counter()
+    issues = fetch_todo_issues(team_id, api_key, BATCH_SIZE)
+    if not issues:
+        return "No Todo issue found"
+    issue_texts = [issue_to_text(issue) for issue in issues]
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        agent_texts = list(executor.map(solve_issue, issue_texts))
+
+    if BATCH_WRITE_BACK:
+        # failed issues stay in Todo without a comment
+        advices = [
+            (issue["id"], text)
+            for issue, text in zip(issues, agent_texts)
+            if text is not None
+        ]
+        if advices:
+            write_back(team_id, advices)
+    elapsed = time.perf_counter() - start
+
+    issues_per_minute = len(issues) / elapsed * 60
+    print(
+        f"batch:{len(issues)} issues in {elapsed:.1f}s({issues_per_minute:.2f} issues/min)"
+    )
+    text = f"**{len(issues)} issues in {elapsed:.1f}s,{issues_per_minute:.2f} issues/min**\n\n"
+    for issue_text, agent_text in zip(issue_texts, agent_texts):
+        if agent_text is None:
+            agent_text = "Agent error,see the log"
+        text += f"## Issue\n{issue_text}\n\n## Agent advice\n{agent_text}\n\n"
+    return text
 
 
 with gr.Blocks() as demo:
@@ -298,7 +429,7 @@ with gr.Blocks() as demo:
 <h2>Post-Duplication/Cloning Instructions</h2>
             <p>Need Linear.app acount and api key</a>
             <p>change script team name to your team name,add "Reviewing" State in your linear.app team setting<p>
-            <p>comment out add_comment(),change_state_reviewing()</p> 
+            <p>comment out write_back()</p> 
             """)
     with gr.Row():
         with gr.Column():
@@ -309,12 +440,29 @@ with gr.Blocks() as demo:
             gr.Markdown("## Agent advice(Don't trust them completely)")
             # output = gr.Markdown(load_text("output.md"))
             output = gr.Markdown("agent result")
-        demo.load(update_text, inputs=None, outputs=[issue, output])
+        demo.load(
+            update_text,
+            inputs=None,
+            outputs=[issue, output],
+            concurrency_limit=PAGE_LOAD_CONCURRENCY,
+            # the streamed steps replace the text,no progress overlay on top
+            show_progress="hidden",
+        )
 
     # for manual solve
     # bt = gr.Button("Next Todo")
     # bt.click(update_text, inputs=None, outputs=[issue, output])
 
+    if BATCH_MODE:
+        batch_button = gr.Button("Process Todo batch")
+        batch_output = gr.Markdown("")
+        batch_button.click(
+            process_todo_batch,
+            inputs=None,
+            outputs=[batch_output],
+            concurrency_limit=1,
+        )
+
 
 if __name__ == "__main__":  # without main call demo called twice
     demo.launch()
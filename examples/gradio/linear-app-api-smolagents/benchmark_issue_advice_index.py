@@ -0,0 +1,92 @@
+# This code is licensed under the MIT License.
+# Copyright (c) [2025] [Akihito Miyazaki]
+#
+"""
+Offline recall/latency benchmark of IssueAdviceIndex on synthetic issues.
+
+Stored issues are random sentences. Queries are either a stored issue with a few
+words edited or an unrelated sentence. Ground truth is the exact Jaccard similarity
+of the shingles,compared against a brute-force scan over every stored issue.
+
+usage: python benchmark_issue_advice_index.py --issues 1000 --queries 300
+"""
+
+import argparse
+import random
+import time
+
+from issue_advice_index import IssueAdviceIndex, jaccard, shingles
+
+WORDS = (
+    "how to learn smolagent agent tool model issue linear webhook gradio space "
+    "deploy error token limit groq llama prompt code python install update state "
+    "review comment team label priority todo cache server request response api "
+    "timeout retry async queue worker batch stream ui page reload memory disk"
+).split()
+
+
+def random_issue(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def edit_issue(rng, text, edits):
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--words", type=int, default=30)
+    parser.add_argument("--edits", type=int, default=2)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    issues = [random_issue(rng, args.words) for _ in range(args.issues)]
+    index = IssueAdviceIndex(threshold=args.threshold, max_entries=args.issues)
+    start = time.perf_counter()
+    for i, text in enumerate(issues):
+        index.add(text, f"advice {i}")
+    add_time = time.perf_counter() - start
+
+    queries = []
+    for _ in range(args.queries):
+        if rng.random() < 0.5:
+            queries.append(edit_issue(rng, rng.choice(issues), args.edits))
+        else:
+            queries.append(random_issue(rng, args.words))
+    issue_shingles = [shingles(text) for text in issues]
+
+    found = relevant = false_positive = 0
+    index_time = brute_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        match = index.query(query)
+        index_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        query_shingles = shingles(query)
+        best = max(jaccard(query_shingles, other) for other in issue_shingles)
+        brute_time += time.perf_counter() - start
+
+        if best >= args.threshold:
+            relevant += 1
+            if match is not None:
+                found += 1
+        elif match is not None:
+            false_positive += 1
+
+    print(f"issues:{args.issues} queries:{args.queries} threshold:{args.threshold}")
+    print(f"add:        {add_time / args.issues * 1000:8.3f} ms/issue")
+    print(f"index:      {index_time / args.queries * 1000:8.3f} ms/query")
+    print(f"brute force:{brute_time / args.queries * 1000:8.3f} ms/query")
+    print(f"recall:     {found}/{relevant} = {found / max(relevant, 1):.3f}")
+    print(f"false positives: {false_positive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# This code is licensed under the MIT License.
+# Copyright (c) [2025] [Akihito Miyazaki]
+#
+"""
+Per-query latency of `requests.post` (one connection per query, the old behavior)
+against the pooled keep-alive `LinearClient`, measured on a local stub server.
+
+usage: python benchmark_linear_client.py --count 200 --latency 0.0
+
+The stub is plain http, so the TLS part of the handshake saved on api.linear.app
+is not included here; real gains are larger than the numbers printed.
+"""
+
+import argparse
+import time
+
+import requests
+
+from linear_api_utils import LinearClient, request_linear
+from linear_stub_server import start_stub_server
+
+HEADERS = {"Content-Type": "application/json", "Authorization": "lin_api_stub"}
+QUERY = {"query": "query Teams { teams { nodes { id name } } }"}
+
+
+def bench(label, count, call, server):
+    start_connections = server.connection_count
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    total = time.perf_counter() - start
+    connections = server.connection_count - start_connections
+    print(
+        f"{label:<24} {total / count * 1000:8.3f} ms/query  connections:{connections}"
+    )
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency=args.latency)
+    client = LinearClient(url=url)
+    try:
+        before = bench(
+            "requests.post",
+            args.count,
+            lambda: requests.post(url, headers=HEADERS, json=QUERY).json(),
+            server,
+        )
+        after = bench(
+            "LinearClient(pooled)",
+            args.count,
+            lambda: request_linear(HEADERS, QUERY, url=url, client=client),
+            server,
+        )
+        print(f"speedup: {before / after:.2f}x")
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# This code is licensed under the MIT License.
+# Copyright (c) [2025] [Akihito Miyazaki]
+#
+"""
+Latency of the Todo priority scan on a local stub server:
+one query per priority (old behavior) against one aliased query for all priorities.
+
+usage: python benchmark_todo_issue.py --count 20 --latency 0.05 --priority 4
+
+`--latency` stands in for the round trip to api.linear.app and `--priority` is the
+priority of the only Todo issue,4(low) is the worst case for the sequential scan.
+"""
+
+import argparse
+import contextlib
+import io
+import re
+import time
+
+from linear_api_utils import (
+    TODO_PRIORITY_ORDER,
+    LinearClient,
+    execute_operation,
+    pick_todo_issue,
+    todo_issues_operation,
+    todo_issues_variables,
+)
+from linear_stub_server import start_stub_server
+
+ALIAS_PATTERN = re.compile(r"p(\d+): issues")
+
+
+def make_responder(todo_priority):
+    issue = {
+        "id": "stub-issue",
+        "title": "how to learn smolagent",
+        "description": "stub",
+        "createdAt": "2025-01-01T00:00:00.000Z",
+    }
+
+    def responder(payload):
+        team = {"id": "stub-team"}
+        for priority in ALIAS_PATTERN.findall(payload["query"]):
+            nodes = [issue] if int(priority) == todo_priority else []
+            team[f"p{priority}"] = {"nodes": nodes}
+        return {"data": {"team": team}}
+
+    return responder
+
+
+def find_todo_issue(client, batched):
+    if batched:
+        priority_batches = [TODO_PRIORITY_ORDER]
+    else:
+        priority_batches = [[priority] for priority in TODO_PRIORITY_ORDER]
+    for priorities in priority_batches:
+        result = execute_operation(
+            todo_issues_operation(tuple(priorities)),
+            todo_issues_variables("stub-team"),
+            "lin_api_stub",
+            client=client,
+        )
+        issue = pick_todo_issue(result["data"]["team"], priorities)
+        if issue is not None:
+            return issue
+    return None
+
+
+def bench(label, count, client, batched, server):
+    start_requests = server.request_count
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # execute_operation is verbose
+        for _ in range(count):
+            assert find_todo_issue(client, batched) is not None
+    total = time.perf_counter() - start
+    requests_per_scan = (server.request_count - start_requests) / count
+    print(
+        f"{label:<12} {total / count * 1000:8.3f} ms/scan  requests/scan:{requests_per_scan:.0f}"
+    )
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--priority", type=int, default=4)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(make_responder(args.priority), args.latency)
+    client = LinearClient(url=url)
+    try:
+        sequential = bench("sequential", args.count, client, False, server)
+        batched = bench("batched", args.count, client, True, server)
+        print(f"speedup: {sequential / batched:.2f}x")
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
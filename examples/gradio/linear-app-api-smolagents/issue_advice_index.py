@@ -0,0 +1,148 @@
+# This code is licensed under the MIT License.
+# Copyright (c) [2025] [Akihito Miyazaki]
+#
+"""
+MinHash index of solved issue texts,so near-duplicate issues can reuse
+(or start from) the advice of an earlier agent run instead of running cold.
+
+No extra dependency is needed. Texts are turned into character shingles,
+MinHash signatures estimate Jaccard similarity and LSH bands keep the lookup
+independent of the number of stored issues.
+"""
+
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+AdviceMatch = namedtuple("AdviceMatch", ["similarity", "text", "advice"])
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", str(text).lower()).strip()
+
+
+def shingles(text, size=5):
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class IssueAdviceIndex:
+    """
+    Incremental,memory-bounded near-duplicate index of issue text -> advice.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity of a match.
+        num_perm (int): MinHash permutations,more is more accurate and slower.
+        bands (int): LSH bands,`num_perm` must be divisible by it.
+            More bands find less similar candidates.
+        shingle_size (int): Characters per shingle.
+        max_entries (int): Oldest issues are dropped above this size.
+        seed (int): Seed of the hash permutations.
+    """
+
+    def __init__(
+        self,
+        threshold=0.8,
+        num_perm=64,
+        bands=16,
+        shingle_size=5,
+        max_entries=1000,
+        seed=1,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._entries = OrderedDict()  # key -> (signature, text, advice)
+        self._buckets = [dict() for _ in range(bands)]  # band -> {band hash: keys}
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        hashes = [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+                "little",
+            )
+            for shingle in shingles(text, self.shingle_size)
+        ]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows : (band + 1) * self.rows]
+
+    def add(self, text, advice):
+        """Adds(or replaces) the advice of an issue text."""
+        key = normalize_text(text)
+        signature = self.signature(text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (signature, text, advice)
+            for band, band_signature in self._bands(signature):
+                self._buckets[band].setdefault(band_signature, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        signature, _, _ = self._entries.pop(key)
+        for band, band_signature in self._bands(signature):
+            keys = self._buckets[band].get(band_signature)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[band][band_signature]
+
+    def query(self, text, threshold=None):
+        """
+        Returns the most similar stored issue as AdviceMatch,or None below `threshold`.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        signature = self.signature(text)
+        with self._lock:
+            candidates = set()
+            for band, band_signature in self._bands(signature):
+                candidates |= self._buckets[band].get(band_signature, set())
+            best = None
+            for key in candidates:
+                stored_signature, stored_text, advice = self._entries[key]
+                similarity = (
+                    sum(x == y for x, y in zip(signature, stored_signature))
+                    / self.num_perm
+                )
+                if similarity >= threshold and (
+                    best is None or similarity > best.similarity
+                ):
+                    best = AdviceMatch(similarity, stored_text, advice)
+            if best is not None:
+                self._entries.move_to_end(normalize_text(best.text))
+            return best
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,72 @@
+# This code is licensed under the MIT License.
+# Copyright (c) [2025] [Akihito Miyazaki]
+#
+"""
+Local stub of the Linear GraphQL endpoint for benchmarks.
+
+No network or api key is needed. Every POST is answered with the json returned by
+`responder(payload)` after an optional artificial `latency` (seconds).
+The server speaks HTTP/1.1 so keep-alive connections are reused like api.linear.app.
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def default_responder(payload):
+    return {"data": {}}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # headers and body are separate writes,avoid nagle + delayed ack stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # one handler per tcp connection
+        self.server.connection_count += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        body = json.dumps(self.server.responder(payload)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(responder=default_responder, latency=0.0, port=0):
+    """
+    Start the stub server on a daemon thread.
+
+    Args:
+        responder (callable): Receives the posted json and returns the response json.
+        latency (float): Seconds to sleep before each response.
+        port (int): Port to bind, 0 picks a free one.
+
+    Returns:
+        tuple: (server, url). Call `server.shutdown()` when done.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.daemon_threads = True
+    server.responder = responder
+    server.latency = latency
+    server.request_count = 0
+    server.connection_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/graphql"
+    return server, url
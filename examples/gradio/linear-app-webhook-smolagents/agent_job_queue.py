@@ -0,0 +1,377 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bounded background queue so webhook handlers can ack before the agent runs."""
+
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+from webhook_admission import priority_rank
+
+
+class AgentJobQueue:
+    """
+    Runs blocking agent jobs on a bounded worker pool,most urgent first.
+
+    Webhook handlers `submit()` the job and return immediately, so a slow LLM call
+    no longer holds the webhook response open (and Linear no longer retries it).
+    Waiting jobs run by Linear priority(urgent first,then oldest). When the queue
+    is full a more urgent job takes the place of the least urgent waiting one,
+    which is shed,so urgent issues are not rejected behind a backlog of low ones.
+
+    Args:
+        max_workers (int): Agents running at the same time.
+        max_queue_size (int): Jobs waiting for a worker,`submit()` rejects beyond this.
+        print_metrics (bool): Print `metrics()` when a job is queued or finished.
+    """
+
+    def __init__(self, max_workers=2, max_queue_size=32, print_metrics=True):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.print_metrics = print_metrics
+        self._waiting = []  # heap of (rank, sequence, func, args, kwargs)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._stopped = False
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.shed = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"agent-job-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, *args, priority=None, **kwargs):
+        """
+        Queues `func(*args, **kwargs)`.
+
+        Args:
+            priority (int): Linear priority of the issue,None is ranked as no priority.
+
+        Returns:
+            bool: False if the queue is full of jobs at least as urgent and the job was dropped.
+        """
+        rank = priority_rank(priority)
+        event = "queued"
+        with self._lock:
+            if len(self._waiting) >= self.max_queue_size:
+                least_urgent = max(self._waiting, default=None)
+                if least_urgent is None or least_urgent[0] <= rank:
+                    self.rejected += 1
+                    event = "rejected"
+                else:
+                    self._waiting.remove(least_urgent)
+                    heapq.heapify(self._waiting)
+                    self.shed += 1
+                    event = "shed"
+            if event != "rejected":
+                heapq.heappush(
+                    self._waiting, (rank, next(self._sequence), func, args, kwargs)
+                )
+                self.queued = len(self._waiting)
+                self._ready.notify()
+        self._print_metrics(event)
+        return event != "rejected"
+
+    def is_full(self, priority=None):
+        """True if a job of `priority` would be rejected."""
+        with self._lock:
+            if len(self._waiting) < self.max_queue_size:
+                return False
+            least_urgent = max(self._waiting, default=None)
+            return least_urgent is None or least_urgent[0] <= priority_rank(priority)
+
+    def register(self, func):
+        """Same interface as SharedAgentJobQueue,any callable can be submitted here."""
+        return func
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._waiting and not self._stopped:
+                    self._ready.wait()
+                if not self._waiting:
+                    return
+                _, _, func, args, kwargs = heapq.heappop(self._waiting)
+                self.queued = len(self._waiting)
+                self.running += 1
+            self._run(func, args, kwargs)
+
+    def _run(self, func, args, kwargs):
+        failed = False
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            failed = True
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self.running -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+        self._print_metrics("finished")
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+            }
+
+    def _print_metrics(self, event):
+        if self.print_metrics:
+            print(f"agent job {event}: {self.metrics()}")
+
+    def shutdown(self, wait=True):
+        """Stops the workers once the waiting jobs are done."""
+        with self._lock:
+            self._stopped = True
+            self._ready.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+class SharedAgentJobQueue:
+    """
+    Agent job queue in a SQLite file shared by several processes.
+
+    Webhook worker processes `submit()` jobs,one consumer process(the one with
+    the Gradio UI) `start()`s polling them and runs them on an AgentJobQueue,
+    so every agent result is published in the process that serves the UI.
+    Jobs are stored as the registered function name and json arguments,claimed
+    and shed by Linear priority like AgentJobQueue.
+
+    Args:
+        sqlite_path (str): SQLite file shared by the processes.
+        max_workers (int): Agents running at the same time in the consumer.
+        max_queue_size (int): Jobs waiting in the file,`submit()` rejects beyond this.
+        poll_interval (float): Seconds between polls when the queue is empty.
+        print_metrics (bool): Print metrics when a job is queued or finished.
+    """
+
+    def __init__(
+        self,
+        sqlite_path,
+        max_workers=2,
+        max_queue_size=32,
+        poll_interval=0.5,
+        print_metrics=True,
+    ):
+        self.sqlite_path = sqlite_path
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.poll_interval = poll_interval
+        self.print_metrics = print_metrics
+        self._functions = {}  # name -> function
+        self._local = threading.local()
+        self._consumer = None
+        self._stopped = threading.Event()
+        self._jobs = None
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS agent_jobs (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " name TEXT, args TEXT, status TEXT, queued_at REAL, rank INTEGER)"
+        )
+        try:  # a state file written before jobs had a priority
+            self._db().execute("ALTER TABLE agent_jobs ADD COLUMN rank INTEGER")
+        except sqlite3.OperationalError:
+            pass
+        self.shed = 0
+
+    def _db(self):
+        # one connection per thread,sqlite3 connections are not shared
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.sqlite_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def register(self, func):
+        """Registers a job function by name,every process must register the same ones."""
+        self._functions[func.__name__] = func
+        return func
+
+    def submit(self, func, *args, priority=None):
+        """
+        Queues `func(*args)`,args must be json serializable.
+
+        Args:
+            priority (int): Linear priority of the issue,None is ranked as no priority.
+
+        Returns:
+            bool: False if the queue is full of jobs at least as urgent and the job was dropped.
+        """
+        if self._functions.get(func.__name__) is not func:
+            raise ValueError(f"{func.__name__} is not registered")
+        rank = priority_rank(priority)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            event = "queued"
+            if self._count("queued") >= self.max_queue_size:
+                least_urgent = self._least_urgent()
+                if least_urgent is None or least_urgent[1] <= rank:
+                    event = "rejected"
+                else:
+                    db.execute(
+                        "DELETE FROM agent_jobs WHERE id = ?", (least_urgent[0],)
+                    )
+                    self.shed += 1
+                    event = "shed"
+            if event != "rejected":
+                db.execute(
+                    "INSERT INTO agent_jobs (name, args, status, queued_at, rank)"
+                    " VALUES (?, ?, 'queued', ?, ?)",
+                    (func.__name__, json.dumps(args), time.time(), rank),
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self._print_metrics(event)
+        return event != "rejected"
+
+    def is_full(self, priority=None):
+        """True if a job of `priority` would be rejected."""
+        if self._count("queued") < self.max_queue_size:
+            return False
+        least_urgent = self._least_urgent()
+        return least_urgent is None or least_urgent[1] <= priority_rank(priority)
+
+    def _least_urgent(self):
+        return (
+            self._db()
+            .execute(
+                "SELECT id, rank FROM agent_jobs WHERE status = 'queued'"
+                " ORDER BY rank DESC, id DESC LIMIT 1"
+            )
+            .fetchone()
+        )
+
+    def _count(self, status):
+        return (
+            self._db()
+            .execute("SELECT COUNT(*) FROM agent_jobs WHERE status = ?", (status,))
+            .fetchone()[0]
+        )
+
+    def start(self):
+        """Starts consuming jobs in this process."""
+        if self._consumer is not None:
+            return
+        # jobs of a consumer that died are run again
+        self._db().execute(
+            "UPDATE agent_jobs SET status = 'queued' WHERE status = 'running'"
+        )
+        self._jobs = AgentJobQueue(
+            max_workers=self.max_workers,
+            max_queue_size=self.max_workers,
+            print_metrics=False,
+        )
+        self._consumer = threading.Thread(
+            target=self._consume, name="agent-job-consumer", daemon=True
+        )
+        self._consumer.start()
+
+    def _consume(self):
+        while not self._stopped.is_set():
+            metrics = self._jobs.metrics()
+            if metrics["queued"] + metrics["running"] >= self.max_workers:
+                self._stopped.wait(self.poll_interval)
+                continue
+            job = self._claim()
+            if job is None:
+                self._stopped.wait(self.poll_interval)
+                continue
+            job_id, name, args = job
+            func = self._functions.get(name)
+            if func is None:
+                print(f"agent job {name} is not registered,dropped")
+                self._finish(job_id)
+                continue
+            self._jobs.submit(self._run, job_id, func, args)
+
+    def _claim(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id, name, args FROM agent_jobs WHERE status = 'queued'"
+                " ORDER BY rank, id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE agent_jobs SET status = 'running' WHERE id = ?", (row[0],)
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def _run(self, job_id, func, args):
+        try:
+            func(*args)
+        finally:
+            self._finish(job_id)
+            self._print_metrics("finished")
+
+    def _finish(self, job_id):
+        self._db().execute("DELETE FROM agent_jobs WHERE id = ?", (job_id,))
+
+    def metrics(self):
+        metrics = {
+            "queued": self._count("queued"),
+            "running": self._count("running"),
+            "shed": self.shed,
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+        }
+        if self._jobs is not None:
+            local = self._jobs.metrics()
+            for key in ("completed", "failed"):
+                metrics[key] = local[key]
+        return metrics
+
+    def _print_metrics(self, event):
+        if self.print_metrics:
+            print(f"agent job {event}: {self.metrics()}")
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        if self._consumer is not None:
+            self._consumer.join()
+            self._jobs.shutdown(wait=wait)
@@ -49,16 +49,28 @@ This code includes parts of the Hugging Face Hub library, which is licensed unde
 The full text of the license can be found at: http://www.apache.org/licenses/LICENSE-2.0
 """
 
+import asyncio
 import os
 from pprint import pprint
 
-import gradio as gr
+from fastapi.responses import JSONResponse
 from smolagents import CodeAgent, HfApiModel
 
-from linear_api_utils import execute_query
-from gradio_webhook_server import WebhooksServer
+from linear_api_utils import (
+    WEBHOOK_UPDATE_MUTATION,
+    WEBHOOKS_QUERY,
+    async_execute_operation,
+)
+from gradio_webhook_server import WebhooksServer, is_webhook_worker
 from gradio_webhook_payload import WebhookPayload
-from sleep_per_last_token_model import SleepPerLastTokenModelLiteLLM
+from agent_job_queue import AgentJobQueue, SharedAgentJobQueue
+from webhook_dedup import WebhookDedupStore
+from webhook_capture import WebhookCaptureRecorder
+from webhook_admission import AdmissionController
+from issue_debouncer import IssueDebouncer, SharedIssueDebouncer
+from issue_advice_index import IssueAdviceIndex
+from agent_output_stream import AgentOutputBoard, run_agent_streaming
+from sleep_per_last_token_model import ResponseCache, SleepPerLastTokenModelLiteLLM
 
 # .env
 """
@@ -84,6 +96,43 @@ def get_env_value(key, is_value_error_on_null=True):
 # SETTINGS
 LINEAR_ISSUE_LABEL = "huggingface-public"  # only show issue with this label,I added for demo you can remove this
 LINEAR_WEBHOOK_LABEL = "Huggingface"  # you have to create in linear before run script
+AGENT_MAX_WORKERS = 2  # agents running at the same time
+AGENT_MAX_QUEUE_SIZE = 32  # waiting agent jobs,webhooks get 503 beyond this
+DEDUP_MAX_ENTRIES = 1024  # remembered webhook events and issues
+DEDUP_COALESCE_WINDOW = 10  # seconds,a just handled issue waits this long to run again
+# e.g. "webhook_dedup.sqlite" to keep dedup state between restarts
+DEDUP_SQLITE_PATH = None
+# seconds,an edited issue runs the agent once it is quiet,0 to disable
+DEBOUNCE_QUIET_PERIOD = 5
+# updates changing none of these fields are skipped
+AGENT_INPUT_FIELDS = ("description", "labelIds")
+RESPONSE_CACHE_TTL = 3600  # seconds,identical model requests reuse the response
+# e.g. "response_cache.sqlite" to keep responses between restarts
+RESPONSE_CACHE_PATH = None
+# off by default,agent prompts stay unchanged
+# set "seed" to add the advice of a near-duplicate solved issue to the prompt,
+# or "return" to reuse it without running the agent
+ADVICE_INDEX_MODE = None
+ADVICE_SIMILARITY = 0.8  # estimated Jaccard similarity of a near-duplicate
+ADVICE_INDEX_MAX_ENTRIES = 1000  # solved issues kept in memory
+UI_POLL_INTERVAL = 1  # seconds,open pages show the latest agent output this often
+# e.g. "webhook_capture.jsonl" to record verified webhook requests for debugging
+WEBHOOK_CAPTURE_PATH = None
+# seconds,older webhooks and repeated signatures are rejected,None to disable
+WEBHOOK_REPLAY_WINDOW = 60
+WEBHOOK_MAX_IN_FLIGHT = 8  # webhook handlers running at the same time
+# waiting webhooks,urgent issues replace less urgent ones(429) then 503
+WEBHOOK_MAX_QUEUE = 32
+WEBHOOK_RETRY_AFTER = 5  # seconds,Retry-After of 429/503
+# uvicorn processes serving webhooks on WEBHOOK_WORKER_PORT,1 serves them from the Gradio app only.
+# >1 needs a webhook url reaching that port(WEBHOOK_WORKER_URL),not available on Spaces
+WEBHOOK_WORKERS = 1
+WEBHOOK_WORKER_PORT = 7861
+WEBHOOK_WORKER_URL = None  # e.g. "https://your-host" forwarded to WEBHOOK_WORKER_PORT
+# agent jobs,debounced updates and dedup state shared by the worker processes
+SHARED_STATE_PATH = "webhook_state.sqlite"
+# serve only the webhooks on FastAPI,no Gradio import,UI or share tunnel(fast cold start)
+HEADLESS = False
 # set secret key on Space setting or .env(local)
 # hf_token = get_env_value("HF_TOKEN")
 groq_api_key = get_env_value("GROQ_API_KEY")
@@ -96,27 +145,16 @@ if api_key is None:
 if webhook_key is None:
     raise ValueError("Need LINEAR_WEBHOOK_KEY on secret")
 
-webhook_query_text = """
-query {
-  webhooks{
-    nodes {
-      id
-      label
-      url
-    }
-  }
-}
-"""
 target_webhook_label = LINEAR_WEBHOOK_LABEL  # filter not working,set manual
-target_webhook_id = None
-result = execute_query("webhook", webhook_query_text, api_key)
-for webhook in result["data"]["webhooks"]["nodes"]:
-    if target_webhook_label == webhook["label"]:
-        target_webhook_id = webhook["id"]
 
 
 app = None
 
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, sqlite_path=RESPONSE_CACHE_PATH)
+advice_index = IssueAdviceIndex(
+    threshold=ADVICE_SIMILARITY, max_entries=ADVICE_INDEX_MAX_ENTRIES
+)
+
 
 """
 model = HfApiModel(
@@ -146,102 +184,260 @@ def save_text(path, text):
         f.write(text)
 
 
-def update_text():
-    return app.issue, app.output
-
-
-with gr.Blocks() as demo:
-    gr.HTML("""<h1>Linear.app Webhook Server</h1>
-            <p>This is Demo of Direct Webhook-triggered AIAgen</p>
-            <p>it's still just simple code,you have to reload when webhooked.</p>
-            <p><b>Imagine an agent, responding instantly.</b></p> 
-            <p>Technically Gradio have no way to update without action<p>
-            <p></p><br>
-            <p>I'm confused by Hugging Face's new pricing system. I'm worried about potentially massive inference API bills, so I switched to Groq.</p>
-            <p>I believe my use of the Groq API is currently compliant with Hugging Face's Content Policy.</p>
-            <p>If you have any questions, please disable the Space or contact me before taking any action against my account.  Thank you for your understanding.</p>
-            """)
-    with gr.Row():
-        with gr.Column():
-            gr.Markdown("## Issue")
-            # issue = gr.Markdown(load_text("issue.md"))
-            issue = gr.Markdown("issue")
-        with gr.Column():
-            gr.Markdown("## Agent advice(Don't trust them completely)")
-            # output = gr.Markdown(load_text("output.md"))
-            output = gr.Markdown("agent result")
-        demo.load(update_text, inputs=None, outputs=[issue, output])
-
-    # bt = gr.Button("Ask AI")
-    # bt.click(update, outputs=[issue_box, output_box])
+# latest issue and agent output,polled by open pages
+board = AgentOutputBoard(issue="how to learn smolagent", output="join course")
+
 
+def update_text():
+    return board.snapshot()
+
+
+def build_ui():
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.HTML("""<h1>Linear.app Webhook Server</h1>
+                <p>This is Demo of Direct Webhook-triggered AIAgen</p>
+                <p>it's still just simple code,the page updates while the agent is answering.</p>
+                <p><b>Imagine an agent, responding instantly.</b></p> 
+                <p></p><br>
+                <p>I'm confused by Hugging Face's new pricing system. I'm worried about potentially massive inference API bills, so I switched to Groq.</p>
+                <p>I believe my use of the Groq API is currently compliant with Hugging Face's Content Policy.</p>
+                <p>If you have any questions, please disable the Space or contact me before taking any action against my account.  Thank you for your understanding.</p>
+                """)
+        with gr.Row():
+            with gr.Column():
+                gr.Markdown("## Issue")
+                # issue = gr.Markdown(load_text("issue.md"))
+                issue = gr.Markdown("issue")
+            with gr.Column():
+                gr.Markdown("## Agent advice(Don't trust them completely)")
+                # output = gr.Markdown(load_text("output.md"))
+                output = gr.Markdown("agent result")
+            # short polls,no request stays open and no progress overlay is shown
+            demo.load(
+                update_text,
+                inputs=None,
+                outputs=[issue, output],
+                concurrency_limit=None,
+                show_progress="hidden",
+            )
+            gr.Timer(UI_POLL_INTERVAL).tick(
+                update_text,
+                inputs=None,
+                outputs=[issue, output],
+                concurrency_limit=None,
+                show_progress="hidden",
+            )
+
+        # bt = gr.Button("Ask AI")
+        # bt.click(update, outputs=[issue_box, output_box])
+    return demo
+
+
+capture_recorder = None
+if WEBHOOK_CAPTURE_PATH is not None:
+    capture_recorder = WebhookCaptureRecorder(WEBHOOK_CAPTURE_PATH)
 app = WebhooksServer(
-    ui=demo,
+    # webhook workers and headless mode never import gradio
+    ui=None if HEADLESS or is_webhook_worker() else build_ui(),
     webhook_secret=webhook_key,  # loaded by load_api_key
+    capture_recorder=capture_recorder,
+    replay_window=WEBHOOK_REPLAY_WINDOW,
+    # limits are per process,split between the webhook workers
+    admission=AdmissionController(
+        max_in_flight=max(1, WEBHOOK_MAX_IN_FLIGHT // WEBHOOK_WORKERS),
+        max_queue=WEBHOOK_MAX_QUEUE // WEBHOOK_WORKERS,
+        retry_after=WEBHOOK_RETRY_AFTER,
+    ),
 )
 
-app.output = "join course"
-app.issue = "how to learn smolagent"
 
-
-@app.add_webhook("/linear_webhook")
-async def updated(payload: WebhookPayload):
-    def generate_agent():
-        model = SleepPerLastTokenModelLiteLLM(
-            max_tokens=250,
-            temperature=0.5,
-            model_id="groq/llama3-8b-8192",
-            api_base="https://api.groq.com/openai/v1/",
-            api_key=groq_api_key,
-        )
-        agent = CodeAgent(
-            model=model,
-            tools=[],  ## add your tools here (don't remove final answer)
-            max_steps=1,
-            verbosity_level=1,
-            grammar=None,
-            planning_interval=None,
-            name=None,
-            description=None,
+def generate_agent():
+    model = SleepPerLastTokenModelLiteLLM(
+        max_tokens=250,
+        temperature=0.5,
+        model_id="groq/llama3-8b-8192",
+        api_base="https://api.groq.com/openai/v1/",
+        api_key=groq_api_key,
+        response_cache=response_cache,
+    )
+    agent = CodeAgent(
+        model=model,
+        tools=[],  ## add your tools here (don't remove final answer)
+        max_steps=1,
+        verbosity_level=1,
+        grammar=None,
+        planning_interval=None,
+        name=None,
+        description=None,
+    )
+    return agent
+
+
+def run_agent(text):
+    # every publish carries this run's issue with its output,
+    # concurrent runs never show one issue with another's advice
+    board.publish(issue=text, output="Agent is thinking...")
+    # save_text("issue.md", text)
+    task = f"how to solve this issue:{text}"
+    advice_match = None
+    if ADVICE_INDEX_MODE is not None and text:
+        advice_match = advice_index.query(text)
+    if advice_match is not None:
+        print(f"similar issue found({advice_match.similarity:.2f}):{advice_match.text}")
+        if ADVICE_INDEX_MODE == "return":
+            board.publish(issue=text, output=advice_match.advice)
+            return
+        task += f"\nA similar issue was solved before with this advice:\n{advice_match.advice}"
+
+    agent = generate_agent()
+    result = None
+    for steps_markdown, final_answer in run_agent_streaming(agent, task):
+        if final_answer is None:
+            board.publish(issue=text, output=steps_markdown)
+        else:
+            result = final_answer
+    board.publish(issue=text, output=str(result))
+    if ADVICE_INDEX_MODE is not None and text:
+        advice_index.add(text, str(result))
+    # save_text("output.md", result)
+
+
+def changes_agent_input(payload):
+    """
+    False if the update only changed fields the agent does not read(e.g. state).
+    `updatedFrom` holds the previous values of the changed fields only.
+    """
+    if payload.action != "update" or payload.updatedFrom is None:
+        return True
+    changed = payload.updatedFrom.model_fields_set
+    return any(field in changed for field in AGENT_INPUT_FIELDS)
+
+
+def queue_agent(issue_id, text, priority=None):
+    if webhook_dedup.recently_handled(issue_id):
+        # the latest text waits for the window to end instead of being dropped
+        delay = max(webhook_dedup.handled_remaining(issue_id), 0.1)
+        print(f"issue {issue_id} was just handled,retried in {delay:.1f}s")
+        issue_debouncer.submit_after(
+            delay, issue_id, queue_agent, issue_id, text, priority
         )
-        return agent
+        return
+    # urgent issues run first and shed the least urgent waiting job when the queue is full
+    if not agent_jobs.submit(run_agent, text, priority=priority):
+        # not run,the next update of the issue is not coalesced into this one
+        webhook_dedup.forget_handled(issue_id)
+        print(f"agent queue is full,issue {issue_id} dropped")
+
+
+if WEBHOOK_WORKERS > 1:
+    # webhooks are handled in several processes,debounced calls and agents run in the Gradio one
+    issue_debouncer = SharedIssueDebouncer(
+        SHARED_STATE_PATH, quiet_period=DEBOUNCE_QUIET_PERIOD
+    )
+    webhook_dedup = WebhookDedupStore(
+        max_entries=DEDUP_MAX_ENTRIES,
+        coalesce_window=DEDUP_COALESCE_WINDOW,
+        sqlite_path=DEDUP_SQLITE_PATH or SHARED_STATE_PATH,
+    )
+    agent_jobs = SharedAgentJobQueue(
+        SHARED_STATE_PATH,
+        max_workers=AGENT_MAX_WORKERS,
+        max_queue_size=AGENT_MAX_QUEUE_SIZE,
+    )
+else:
+    issue_debouncer = IssueDebouncer(quiet_period=DEBOUNCE_QUIET_PERIOD)
+    webhook_dedup = WebhookDedupStore(
+        max_entries=DEDUP_MAX_ENTRIES,
+        coalesce_window=DEDUP_COALESCE_WINDOW,
+        sqlite_path=DEDUP_SQLITE_PATH,
+    )
+    agent_jobs = AgentJobQueue(
+        max_workers=AGENT_MAX_WORKERS, max_queue_size=AGENT_MAX_QUEUE_SIZE
+    )
+agent_jobs.register(run_agent)
+issue_debouncer.register(queue_agent)
 
-    pprint(payload.dict(), indent=4)
 
-    data = payload.dict()["data"]
+@app.add_webhook("/linear_webhook")
+async def updated(payload: WebhookPayload, body: dict):
+    # body is the parsed json payload was validated from,nothing is copied
+    pprint(body, indent=4)
+    data = payload.data
+    # the dedup store and the shared queues may wait on SQLite locks,off the event loop
+    if await asyncio.to_thread(
+        webhook_dedup.seen_event,
+        payload.webhookId,
+        payload.webhookTimestamp,
+        data.id,
+        data.updatedAt,
+    ):
+        print("duplicate webhook,skipped")
+        return {"message": "duplicate"}
+
     has_label = True
     if LINEAR_ISSUE_LABEL:
         has_label = False
-        for label in data["labels"]:
-            if label["name"] == LINEAR_ISSUE_LABEL:
+        for label in data.labels:
+            if label.name == LINEAR_ISSUE_LABEL:
                 has_label = True
 
     if has_label:
-        text = data["description"]
-        app.issue = text
-        # save_text("issue.md", text)
-        agent = generate_agent()
-        result = agent.run(f"how to solve this issue:{text}")
-        app.output = result
-        # save_text("output.md", result)
+        if not changes_agent_input(payload):
+            print(f"issue {data.id} changed nothing the agent reads,skipped")
+            return {"message": "skipped"}
+        if await asyncio.to_thread(agent_jobs.is_full, data.priority):
+            # not accepted,the retry of this delivery must not be a duplicate
+            await asyncio.to_thread(
+                webhook_dedup.forget_event,
+                payload.webhookId,
+                payload.webhookTimestamp,
+                data.id,
+                data.updatedAt,
+            )
+            return JSONResponse(
+                {"error": "Agent queue is full."},
+                status_code=503,
+                headers={"Retry-After": str(WEBHOOK_RETRY_AFTER)},
+            )
+        # ack now,the latest text of the issue is queued once it is quiet
+        await asyncio.to_thread(
+            issue_debouncer.submit,
+            data.id,
+            queue_agent,
+            data.id,
+            data.description,
+            data.priority,
+        )
     return {"message": "ok"}
 
 
-def webhook_update(url):
-    webhook_update_text = """
-mutation {
-  webhookUpdate(
-    id: "%s"
-    input:{
-    url:"%s"
-    }
-  ) {
-    success
-  }
-}
-""" % (target_webhook_id, url)
-    result = execute_query("webhook_update", webhook_update_text, api_key)
+async def webhook_update(url):
+    # only the launching process looks the webhook up,workers import this module too
+    target_webhook_id = None
+    result = await async_execute_operation(WEBHOOKS_QUERY, None, api_key)
+    for webhook in result["data"]["webhooks"]["nodes"]:
+        if target_webhook_label == webhook["label"]:
+            target_webhook_id = webhook["id"]
+    if target_webhook_id is None:
+        print(f"webhook {target_webhook_label} is not found,create it in Linear")
+        return
+    result = await async_execute_operation(
+        WEBHOOK_UPDATE_MUTATION, {"id": target_webhook_id, "url": url}, api_key
+    )
 
 
 if __name__ == "__main__":  # without main call twice
-    app.launch(webhook_update=webhook_update)
+    if WEBHOOK_WORKERS > 1:
+        # only this process runs debounced calls and agents and updates the UI
+        issue_debouncer.start()
+        agent_jobs.start()
+    app.launch(
+        webhook_update=webhook_update,
+        workers=WEBHOOK_WORKERS,
+        worker_app="app:app",
+        worker_port=WEBHOOK_WORKER_PORT,
+        worker_url=WEBHOOK_WORKER_URL,
+        headless=HEADLESS,
+    )
@@ -0,0 +1,96 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cold start of WebhooksServer,Gradio `launch()` against `launch(headless=True)`.
+
+Each run starts a new python process serving one webhook and measures the time
+until the first webhook request is answered. No Linear or model api is called.
+
+usage: python benchmark_startup.py --runs 3
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+MODES = ("gradio", "headless")
+
+
+def serve(mode, port):
+    from gradio_webhook_server import WebhooksServer
+
+    app = WebhooksServer(replay_window=None)
+
+    @app.add_webhook("/ping")
+    async def ping(body: dict):
+        return {"message": "pong"}
+
+    app.launch(headless=mode == "headless", share=False, server_port=port)
+
+
+def start_time(mode, port, timeout):
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--serve", mode, "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                return None  # e.g. gradio is not installed
+            try:
+                response = httpx.post(
+                    f"http://127.0.0.1:{port}/webhooks/ping", json={}, timeout=1
+                )
+                if response.status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        return None
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=7870)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--serve", choices=MODES)
+    args = parser.parse_args()
+    if args.serve is not None:
+        serve(args.serve, args.port)
+        return
+
+    for mode in MODES:
+        times = [start_time(mode, args.port, args.timeout) for _ in range(args.runs)]
+        if None in times:
+            print(f"{mode:<9} failed to start(is it installed?)")
+            continue
+        print(
+            f"{mode:<9} median {statistics.median(times):6.2f} s"
+            f"  min {min(times):6.2f} s  runs:{args.runs}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Requests/sec of the webhook body pipeline,in process(no network,no Gradio).
+
+legacy: the body is read and json.loads-ed for the signature check,FastAPI parses
+        and validates it again into WebhookPayload,the handler calls payload.dict() twice.
+single: `WebhookMiddleware` in front of the app,HMAC on the raw bytes,one parse,one validation.
+
+usage: python benchmark_webhook_pipeline.py --requests 2000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware import Middleware
+
+from gradio_webhook_payload import WebhookPayload
+from gradio_webhook_server import WebhookMiddleware, WebhooksServer, verify_signature
+
+SECRET = "benchmark-secret"
+
+
+def make_body(description_size):
+    timestamp = "2025-01-01T00:00:00.000Z"
+    payload = {
+        "action": "update",
+        "type": "Issue",
+        "createdAt": timestamp,
+        "data": {
+            "id": "issue-1",
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+            "title": "how to learn smolagent",
+            "description": "x" * description_size,
+            "labels": [
+                {"id": "label-1", "color": "#fff", "name": "huggingface-public"}
+            ],
+            "priority": 2,
+            "state": {
+                "id": "state-1",
+                "color": "#fff",
+                "name": "Todo",
+                "type": "unstarted",
+            },
+            "team": {"id": "team-1", "name": "Agent", "key": "AGE"},
+        },
+        "url": "https://linear.app/issue/AGE-1",
+        "webhookTimestamp": 1735689600000,
+        "webhookId": "webhook-1",
+        "updatedFrom": {"updatedAt": timestamp, "description": "old"},
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def make_app():
+    # the same body is sent again and again
+    server = WebhooksServer(webhook_secret=SECRET, replay_window=None)
+    app = FastAPI(middleware=[Middleware(WebhookMiddleware, server=server)])
+
+    @app.post("/legacy")
+    async def legacy(request: Request, payload: WebhookPayload):
+        request_text = await request.body()
+        json.loads(request_text.decode())
+        if not verify_signature(request.headers, request_text, SECRET):
+            return JSONResponse({"error": "Invalid webhook secret."}, status_code=403)
+        payload.model_dump()  # pprint
+        data = payload.model_dump()["data"]
+        return {"message": data["id"]}
+
+    @server.add_webhook("/single")
+    async def single(payload: WebhookPayload, body: dict):
+        return {"message": payload.data.id}
+
+    return app
+
+
+async def bench(client, path, body, headers, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = await client.post(path, content=body, headers=headers)
+        assert response.status_code == 200, response.text
+    return count / (time.perf_counter() - start)
+
+
+async def run(args):
+    body = make_body(args.description_size)
+    signature = hmac.new(SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    headers = {"Content-Type": "application/json", "linear-signature": signature}
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for path in ("/legacy", "/webhooks/single"):
+            await bench(client, path, body, headers, 50)  # warm up
+        legacy = await bench(client, "/legacy", body, headers, args.requests)
+        single = await bench(client, "/webhooks/single", body, headers, args.requests)
+    print(f"body:{len(body)} bytes requests:{args.requests}")
+    print(f"legacy:{legacy:9.1f} requests/sec")
+    print(f"single:{single:9.1f} requests/sec")
+    print(f"speedup: {single / legacy:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--description-size", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
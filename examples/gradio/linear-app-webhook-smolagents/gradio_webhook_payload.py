@@ -81,7 +81,10 @@ else:
 class WebhookPayloadUploadFrom(BaseModel):
     stateId: Optional[str] = None
     updatedAt: datetime
+    title: Optional[str] = None
     description: Optional[str] = None
+    priority: Optional[int] = None
+    labelIds: Optional[List[str]] = None
 
 
 class WebhookPayloadTeam(BaseModel):
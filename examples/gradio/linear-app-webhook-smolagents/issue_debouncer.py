@@ -0,0 +1,188 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-issue debouncer so a burst of edits runs the agent once."""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class IssueDebouncer:
+    """
+    Waits until an issue has been quiet for `quiet_period` seconds,then calls
+    the function of its latest `submit()` only.
+
+    Editing a description in Linear fires many update webhooks within seconds,
+    each `submit()` for the same key replaces the pending call and restarts the wait.
+
+    Args:
+        quiet_period (float): Seconds without a new event before the call runs,0 runs immediately.
+    """
+
+    def __init__(self, quiet_period=5.0):
+        self.quiet_period = quiet_period
+        self._pending = {}  # key -> (token, timer, call)
+        self._lock = threading.Lock()
+        self.replaced = 0
+
+    def register(self, func):
+        """Same interface as SharedIssueDebouncer,any callable can be submitted here."""
+        return func
+
+    def submit(self, key, func, *args, **kwargs):
+        if self.quiet_period <= 0:
+            func(*args, **kwargs)
+            return
+        self.submit_after(self.quiet_period, key, func, *args, **kwargs)
+
+    def submit_after(self, delay, key, func, *args, **kwargs):
+        """
+        Like `submit()` but waits `delay` seconds,e.g. until the issue may run again.
+        """
+        token = object()
+        timer = threading.Timer(delay, self._fire, (key, token))
+        timer.daemon = True
+        with self._lock:
+            previous = self._pending.get(key)
+            if previous is not None:
+                previous[1].cancel()
+                self.replaced += 1
+            self._pending[key] = (token, timer, (func, args, kwargs))
+            timer.start()
+
+    def _fire(self, key, token):
+        with self._lock:
+            entry = self._pending.get(key)
+            # replaced while the timer was firing
+            if entry is None or entry[0] is not token:
+                return
+            del self._pending[key]
+        func, args, kwargs = entry[2]
+        func(*args, **kwargs)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class SharedIssueDebouncer:
+    """
+    IssueDebouncer whose pending calls live in a SQLite file shared by several processes.
+
+    Webhook worker processes `submit()`,the latest call of each key replaces the
+    previous one in the file whichever worker received it. One process `start()`s
+    polling and runs the calls that have been quiet for `quiet_period`,so a burst
+    spread over the workers runs once with the latest payload.
+    Calls are stored as the registered function name and json arguments.
+
+    Args:
+        sqlite_path (str): SQLite file shared by the processes.
+        quiet_period (float): Seconds without a new event before the call runs,0 runs immediately.
+        poll_interval (float): Seconds between polls.
+    """
+
+    def __init__(self, sqlite_path, quiet_period=5.0, poll_interval=0.5):
+        self.sqlite_path = sqlite_path
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self._functions = {}  # name -> function
+        self._local = threading.local()
+        self._poller = None
+        self._stopped = threading.Event()
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS debounced_calls"
+            " (key TEXT PRIMARY KEY, name TEXT, args TEXT, due_at REAL)"
+        )
+
+    def _db(self):
+        # one connection per thread,sqlite3 connections are not shared
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.sqlite_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def register(self, func):
+        """Registers a function by name,every process must register the same ones."""
+        self._functions[func.__name__] = func
+        return func
+
+    def submit(self, key, func, *args):
+        if self.quiet_period <= 0:
+            func(*args)
+            return
+        self.submit_after(self.quiet_period, key, func, *args)
+
+    def submit_after(self, delay, key, func, *args):
+        """
+        Like `submit()` but waits `delay` seconds,args must be json serializable.
+        """
+        if self._functions.get(func.__name__) is not func:
+            raise ValueError(f"{func.__name__} is not registered")
+        self._db().execute(
+            "INSERT INTO debounced_calls (key, name, args, due_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET name = excluded.name,"
+            " args = excluded.args, due_at = excluded.due_at",
+            (key, func.__name__, json.dumps(args), time.time() + delay),
+        )
+
+    def start(self):
+        """Starts running due calls in this process."""
+        if self._poller is not None:
+            return
+        self._poller = threading.Thread(
+            target=self._poll, name="issue-debouncer", daemon=True
+        )
+        self._poller.start()
+
+    def _poll(self):
+        while not self._stopped.is_set():
+            for name, args in self._claim_due():
+                func = self._functions.get(name)
+                if func is None:
+                    print(f"debounced call {name} is not registered,dropped")
+                    continue
+                try:
+                    func(*args)
+                except Exception as e:
+                    print(f"debounced call {name} failed:{e}")
+            self._stopped.wait(self.poll_interval)
+
+    def _claim_due(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT key, name, args FROM debounced_calls WHERE due_at <= ?",
+                (time.time(),),
+            ).fetchall()
+            db.executemany(
+                "DELETE FROM debounced_calls WHERE key = ?", [(row[0],) for row in rows]
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return [(name, json.loads(args)) for _, name, args in rows]
+
+    def pending(self):
+        return self._db().execute("SELECT COUNT(*) FROM debounced_calls").fetchone()[0]
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._poller is not None:
+            self._poller.join()
@@ -20,21 +20,106 @@
 # SOFTWARE.
 #
 
+import asyncio
+import functools
+import hashlib
 import json
 import os
+import threading
 import time
+import weakref
 
 #
+from collections import namedtuple
 from pprint import pprint
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+LINEAR_API_URL = "https://api.linear.app/graphql"
+# send only the sha256 hash of registered operations(Automatic Persisted Queries),
+# the full text is sent once if the server does not know the hash yet.
+# Falls back to the full text per url if the server does not support it.
+PERSISTED_QUERIES = False
 
-def request_linear(
-    headers, data, url="https://api.linear.app/graphql", print_header=False
-):
+
+class LinearClient:
+    """
+    Reusable Linear GraphQL client.
+
+    Holds one pooled keep-alive `requests.Session`, so back to back queries reuse the
+    TCP+TLS connection to api.linear.app instead of paying a new handshake per call.
+
+    Args:
+        url (str): GraphQL endpoint.
+        pool_connections (int): Number of host pools to cache.
+        pool_maxsize (int): Max connections kept alive per host.
+        max_retries (int): Retries on connection errors and 429/503.
+        backoff_factor (float): Exponential backoff factor between retries.
+        timeout (float): Request timeout in seconds.
+    """
+
+    def __init__(
+        self,
+        url=LINEAR_API_URL,
+        pool_connections=1,
+        pool_maxsize=10,
+        max_retries=3,
+        backoff_factor=0.5,
+        timeout=30,
+    ):
+        self.url = url
+        self.timeout = timeout
+        # read errors,502 and 504 are not retried,a mutation may already be applied
+        # 429 and 503 are answered before the request is processed
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset(["POST"]),
+            backoff_factor=backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def post(self, headers, data, url=None):
+        return self.session.post(
+            url or self.url, headers=headers, json=data, timeout=self.timeout
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+
+
+def get_default_client():
+    """
+    Returns the process wide LinearClient, created on first use.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = LinearClient()
+    return _default_client
+
+
+def request_linear(headers, data, url=LINEAR_API_URL, print_header=False, client=None):
+    if client is None:
+        client = get_default_client()
     response_data = None
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = client.post(headers, data, url=url)
 
         response_data = response.json()
         if print_header:
@@ -47,6 +132,9 @@ def request_linear(
     except requests.exceptions.RequestException as e:
         print(response_data)
         print(f"エラーが発生しました: {e}")
+        # graphql errors(400) are returned,so the caller can see which field failed
+        if isinstance(response_data, dict) and "errors" in response_data:
+            return response_data
         exit(0)
     except json.JSONDecodeError as e:
         print(f"JSONデコードエラー: {e}")
@@ -73,7 +161,158 @@ def load_api_key(dir="./"):
         exit(0)
 
 
-def execute_query(label, query_text, authorization, print_header=False):
+def execute_query(
+    label,
+    query_text,
+    authorization,
+    print_header=False,
+    client=None,
+    variables=None,
+    extensions=None,
+):
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": authorization,
+    }
+
+    start_time_total = time.time()
+    print(f"--- 処理の開始:{label} ({time.strftime('%Y-%m-%d %H:%M:%S')}) ---")
+
+    query_dic = {}
+    if query_text is not None:  # None sends only the persisted query hash
+        query_dic["query"] = query_text
+    if variables is not None:
+        query_dic["variables"] = variables
+    if extensions is not None:
+        query_dic["extensions"] = extensions
+    print("--- クエリの表示開始 ---")
+    print(query_text if query_text is not None else f"persisted:{extensions}")
+    if variables is not None:
+        print(json.dumps(variables, indent=2, ensure_ascii=False))
+    print("--- クエリの表示終了 ---")
+    if client is None:
+        client = get_default_client()
+    result = request_linear(
+        headers, query_dic, url=client.url, print_header=print_header, client=client
+    )
+    print("--- 結果の表示開始 ---")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print("--- 結果の表示終了 ---")
+    end_time_total = time.time()
+    total_time = end_time_total - start_time_total
+    print(f"--- 処理の終了:{label} ---")
+    print(f"合計処理時間: {total_time:.4f} 秒")
+
+    print("")  # spacer
+
+    return result
+
+
+class AsyncLinearClient:
+    """
+    Async counterpart of LinearClient for event loop code (FastAPI webhook handlers).
+
+    Built on `httpx.AsyncClient` with a keep-alive connection pool, so a slow Linear
+    call awaits instead of blocking every other request on the server.
+    A client is bound to the event loop it is first used on.
+
+    Args:
+        url (str): GraphQL endpoint.
+        max_connections (int): Max concurrent connections.
+        max_keepalive_connections (int): Max idle connections kept alive.
+        keepalive_expiry (float): Seconds an idle connection is kept.
+        max_retries (int): Retries on connection errors.
+        timeout (float): Request timeout in seconds.
+    """
+
+    def __init__(
+        self,
+        url=LINEAR_API_URL,
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry=30,
+        max_retries=3,
+        timeout=30,
+    ):
+        import httpx
+
+        self.url = url
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=max_retries)
+        self.client = httpx.AsyncClient(transport=transport, timeout=timeout)
+
+    async def post(self, headers, data, url=None):
+        return await self.client.post(url or self.url, headers=headers, json=data)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+# httpx connections belong to one event loop,keep one default client per loop
+_default_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_default_async_client():
+    """
+    Returns the AsyncLinearClient of the running event loop, created on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _default_async_clients.get(loop)
+    if client is None:
+        client = AsyncLinearClient()
+        _default_async_clients[loop] = client
+    return client
+
+
+async def async_request_linear(
+    headers, data, url=LINEAR_API_URL, print_header=False, client=None
+):
+    import httpx
+
+    if client is None:
+        client = get_default_async_client()
+    response_data = None
+    try:
+        response = await client.post(headers, data, url=url)
+
+        response_data = response.json()
+        if print_header:
+            print("--- ヘッダーの表示開始 ---")
+            pprint(dict(response.headers), indent=4)
+            print("--- ヘッダーの表示終了 ---")
+
+        response.raise_for_status()
+        return response_data
+    except httpx.HTTPError as e:
+        print(response_data)
+        print(f"エラーが発生しました: {e}")
+        # graphql errors(400) are returned,so the caller can see which field failed
+        if isinstance(response_data, dict) and "errors" in response_data:
+            return response_data
+    except json.JSONDecodeError as e:
+        print(f"JSONデコードエラー: {e}")
+        print(f"レスポンス内容:\n{response.text}")
+
+
+async def async_execute_query(
+    label,
+    query_text,
+    authorization,
+    print_header=False,
+    client=None,
+    variables=None,
+    extensions=None,
+):
     headers = {
         "Content-Type": "application/json",
         "Authorization": authorization,
@@ -82,11 +321,23 @@ def execute_query(label, query_text, authorization, print_header=False):
     start_time_total = time.time()
     print(f"--- 処理の開始:{label} ({time.strftime('%Y-%m-%d %H:%M:%S')}) ---")
 
-    query_dic = {"query": query_text}
+    query_dic = {}
+    if query_text is not None:  # None sends only the persisted query hash
+        query_dic["query"] = query_text
+    if variables is not None:
+        query_dic["variables"] = variables
+    if extensions is not None:
+        query_dic["extensions"] = extensions
     print("--- クエリの表示開始 ---")
-    print(f"{query_dic['query']}")
+    print(query_text if query_text is not None else f"persisted:{extensions}")
+    if variables is not None:
+        print(json.dumps(variables, indent=2, ensure_ascii=False))
     print("--- クエリの表示終了 ---")
-    result = request_linear(headers, query_dic, print_header=print_header)
+    if client is None:
+        client = get_default_async_client()
+    result = await async_request_linear(
+        headers, query_dic, url=client.url, print_header=print_header, client=client
+    )
     print("--- 結果の表示開始 ---")
     print(json.dumps(result, indent=2, ensure_ascii=False))
     print("--- 結果の表示終了 ---")
@@ -98,3 +349,687 @@ def execute_query(label, query_text, authorization, print_header=False):
     print("")  # spacer
 
     return result
+
+
+class GraphQLOperation:
+    """
+    A GraphQL operation declared once,called with variables only.
+
+    The text is built(and hashed) once,so a call sends a fixed string plus a
+    small variables payload and nothing is formatted or escaped per call.
+
+    Args:
+        name (str): Operation name,used as the log label.
+        text (str): Operation text with `$variables`.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.extensions = {"persistedQuery": {"version": 1, "sha256Hash": self.sha256}}
+
+
+QUERY_REGISTRY = {}  # name -> GraphQLOperation
+
+
+def register_operation(name, text):
+    operation = GraphQLOperation(name, text)
+    QUERY_REGISTRY[name] = operation
+    return operation
+
+
+# url -> False once the server rejected a persisted query
+_persisted_query_support = {}
+
+
+def _persisted_query_status(result):
+    """
+    "ok","not_found"(send the text once) or "unsupported" for a hash only request.
+    """
+    if result is None:
+        return "failed"
+    codes = []
+    for error in result.get("errors", []):
+        codes.append(error.get("message", ""))
+        codes.append((error.get("extensions") or {}).get("code", ""))
+    if any("PersistedQueryNotFound" in str(code) for code in codes):
+        return "not_found"
+    if result.get("data") is None:
+        return "unsupported"
+    return "ok"
+
+
+def execute_operation(
+    operation,
+    variables,
+    authorization,
+    print_header=False,
+    client=None,
+    persisted=None,
+):
+    """
+    Executes a registered GraphQLOperation.
+
+    Args:
+        operation (GraphQLOperation): Operation to execute.
+        variables (dict): Values of the operation variables.
+        authorization (str): Linear API key.
+        print_header (bool): Print the response headers.
+        client (LinearClient): Defaults to the process wide client.
+        persisted (bool): Send the hash only,defaults to PERSISTED_QUERIES.
+
+    Returns:
+        dict: query result json or None.
+    """
+    if client is None:
+        client = get_default_client()
+    if persisted is None:
+        persisted = PERSISTED_QUERIES
+    extensions = None
+    if persisted and _persisted_query_support.get(client.url) is not False:
+        result = execute_query(
+            operation.name,
+            None,
+            authorization,
+            print_header,
+            client,
+            variables,
+            operation.extensions,
+        )
+        status = _persisted_query_status(result)
+        if status == "ok":
+            return result
+        if status == "unsupported":
+            print(f"persisted queries are not supported:{client.url}")
+            _persisted_query_support[client.url] = False
+        else:
+            extensions = operation.extensions  # register the hash with the text
+    return execute_query(
+        operation.name,
+        operation.text,
+        authorization,
+        print_header,
+        client,
+        variables,
+        extensions,
+    )
+
+
+async def async_execute_operation(
+    operation,
+    variables,
+    authorization,
+    print_header=False,
+    client=None,
+    persisted=None,
+):
+    """
+    Async counterpart of execute_operation.
+    """
+    if client is None:
+        client = get_default_async_client()
+    if persisted is None:
+        persisted = PERSISTED_QUERIES
+    extensions = None
+    if persisted and _persisted_query_support.get(client.url) is not False:
+        result = await async_execute_query(
+            operation.name,
+            None,
+            authorization,
+            print_header,
+            client,
+            variables,
+            operation.extensions,
+        )
+        status = _persisted_query_status(result)
+        if status == "ok":
+            return result
+        if status == "unsupported":
+            print(f"persisted queries are not supported:{client.url}")
+            _persisted_query_support[client.url] = False
+        else:
+            extensions = operation.extensions
+    return await async_execute_query(
+        operation.name,
+        operation.text,
+        authorization,
+        print_header,
+        client,
+        variables,
+        extensions,
+    )
+
+
+TEAMS_QUERY = register_operation(
+    "Teams",
+    """
+query Teams {
+  teams {
+    nodes {
+      id
+      name
+    }
+  }
+}
+""",
+)
+
+WORKFLOW_STATES_QUERY = register_operation(
+    "WorkflowStates",
+    """
+query WorkflowStates($teamId: ID!) {
+  workflowStates(filter: { team: { id: { eq: $teamId } } }) {
+    nodes {
+      id
+      name
+    }
+  }
+}
+""",
+)
+
+WEBHOOKS_QUERY = register_operation(
+    "Webhooks",
+    """
+query Webhooks {
+  webhooks {
+    nodes {
+      id
+      label
+      url
+    }
+  }
+}
+""",
+)
+
+WEBHOOK_UPDATE_MUTATION = register_operation(
+    "WebhookUpdate",
+    """
+mutation WebhookUpdate($id: String!, $url: String!) {
+  webhookUpdate(id: $id, input: { url: $url }) {
+    success
+  }
+}
+""",
+)
+
+
+# urgent,high,medium,no priority,low
+TODO_PRIORITY_ORDER = [1, 2, 3, 0, 4]
+
+
+@functools.lru_cache(maxsize=None)
+def todo_issues_operation(priorities):
+    """
+    Registers one query that fetches the first issues of each priority.
+
+    Each priority is an alias `p<priority>` of `team.issues`,so the whole
+    priority scan costs one round trip instead of one per priority.
+    Variables: `teamId`,`stateName` and `first`(issues per priority).
+
+    Args:
+        priorities (tuple[int]): Priorities to fetch.
+
+    Returns:
+        GraphQLOperation: the query,built once per priorities.
+    """
+    issues_text = ""
+    for priority in priorities:
+        issues_text += """
+    p%d: issues(
+      first: $first
+      filter: { state: { name: { eq: $stateName } }, priority: { eq: %d } }
+    ) {
+      nodes {
+        id
+        title
+        description
+        createdAt
+      }
+    }""" % (priority, priority)
+
+    name = "TodoIssues" + "".join(f"P{priority}" for priority in priorities)
+    return register_operation(
+        name,
+        """
+query %s($teamId: String!, $stateName: String!, $first: Int!) {
+  team(id: $teamId) {
+    id%s
+  }
+}
+""" % (name, issues_text),
+    )
+
+
+def todo_issues_variables(team_id, state_name="Todo", first=1):
+    return {"teamId": team_id, "stateName": state_name, "first": first}
+
+
+def pick_todo_issues(team, priorities, limit):
+    """
+    Picks up to `limit` issues following `priorities` from a `todo_issues_operation` result.
+
+    Args:
+        team (dict): `result["data"]["team"]`.
+        priorities (list[int]): Priority order.
+        limit (int): Max issues.
+
+    Returns:
+        list[dict]: issues.
+    """
+    issues = []
+    for priority in priorities:
+        issues += team.get(f"p{priority}", {}).get("nodes", [])
+    return issues[:limit]
+
+
+def fetch_todo_issues(team_id, authorization, limit, client=None):
+    """
+    Fetches the top `limit` Todo issues of a team following TODO_PRIORITY_ORDER.
+
+    One request: each priority alias asks for `limit` issues,so the top `limit`
+    are always in the result whatever their priorities are.
+
+    Args:
+        team_id (str): Team ID.
+        authorization (str): Linear API key.
+        limit (int): Max issues.
+        client (LinearClient): Defaults to the process wide client.
+
+    Returns:
+        list[dict]: issues,empty if the query failed.
+    """
+    result = execute_operation(
+        todo_issues_operation(tuple(TODO_PRIORITY_ORDER)),
+        todo_issues_variables(team_id, first=limit),
+        authorization,
+        client=client,
+    )
+    if result is None or "data" not in result:
+        return []
+    return pick_todo_issues(result["data"]["team"], TODO_PRIORITY_ORDER, limit)
+
+
+def pick_todo_issue(team, priorities):
+    """
+    Picks the first issue following `priorities` from a `todo_issues_operation` result.
+
+    Args:
+        team (dict): `result["data"]["team"]`.
+        priorities (list[int]): Priority order.
+
+    Returns:
+        dict: issue or None.
+    """
+    for priority in priorities:
+        nodes = team.get(f"p{priority}", {}).get("nodes", [])
+        if len(nodes) > 0:
+            return nodes[0]
+    return None
+
+
+class LinearMetadataCache:
+    """
+    In-process TTL cache for Linear metadata that almost never changes (teams, workflow states).
+
+    After warm-up, team name -> id and state name -> id resolve with no network call.
+    Entries expire after `ttl` seconds or with `invalidate()`.
+    If `snapshot_path` is set, entries are also saved to / loaded from that json file,
+    so a restarted process starts warm.
+    Issues change too often to be cached here,`find_todo_issue` always queries.
+
+    Args:
+        ttl (float): Seconds an entry stays valid.
+        snapshot_path (str): Optional json snapshot file.
+        max_entries (int): Expired entries are purged,then the oldest dropped above this size.
+    """
+
+    def __init__(self, ttl=3600, snapshot_path=None, max_entries=10000):
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()  # one writer of the snapshot file
+        if snapshot_path is not None:
+            self.load_snapshot()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now + (ttl or self.ttl), value)
+            if len(self._entries) > self.max_entries:
+                self._purge(now)
+        self.save_snapshot()
+
+    def _purge(self, now):
+        for key in [k for k, (exp, _) in self._entries.items() if exp < now]:
+            del self._entries[key]
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self._entries, key=lambda k: self._entries[k][0])
+            for key in oldest[:overflow]:
+                del self._entries[key]
+
+    def invalidate(self, key=None):
+        """
+        Drops `key`,or every entry if `key` is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        self.save_snapshot()
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Returns the cached value or calls `loader()` and caches its result.
+        None results(failed queries) are not cached.
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl=ttl)
+        return value
+
+    def get_name(self, key, name, loader, ttl=None):
+        """
+        Returns the id of `name` in the cached name -> id map `key`.
+        A name missing from the cached map reloads it once,the entity may be new
+        (e.g. a workflow state added after warm-up).
+        """
+        names = self.get(key)
+        if names is not None and name in names:
+            return names[name]
+        names = loader()
+        if names is None:
+            return None
+        self.set(key, names, ttl=ttl)
+        return names.get(name)
+
+    def load_snapshot(self):
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"スナップショットの読み込みに失敗しました: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, (expires_at, value) in entries.items():
+                if expires_at >= now:
+                    self._entries[key] = (expires_at, value)
+
+    def save_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        # threads write in turn,the last one writes the latest entries
+        with self._snapshot_lock:
+            with self._lock:
+                entries = dict(self._entries)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+
+
+_default_metadata_cache = None
+
+
+def get_default_metadata_cache():
+    """
+    Returns the process wide LinearMetadataCache, created on first use.
+    """
+    global _default_metadata_cache
+    if _default_metadata_cache is None:
+        _default_metadata_cache = LinearMetadataCache()
+    return _default_metadata_cache
+
+
+def get_team_id(team_name, authorization, cache=None, client=None):
+    """
+    Resolves a team name to its ID,querying `teams` only when the name is not cached.
+
+    Args:
+        team_name (str): Team name.
+        authorization (str): Linear API key.
+        cache (LinearMetadataCache): Defaults to the process wide cache.
+        client (LinearClient): Defaults to the process wide client.
+
+    Returns:
+        str: team ID or None.
+    """
+    if cache is None:
+        cache = get_default_metadata_cache()
+
+    def load_teams():
+        result = execute_operation(TEAMS_QUERY, None, authorization, client=client)
+        if result is None or "data" not in result:
+            return None
+        return {team["name"]: team["id"] for team in result["data"]["teams"]["nodes"]}
+
+    return cache.get_name("teams", team_name, load_teams)
+
+
+def get_state_id(team_id, state_name, authorization, cache=None, client=None):
+    """
+    Resolves a workflow state name of a team to its ID,querying `workflowStates` only when the name is not cached.
+
+    Args:
+        team_id (str): Team ID.
+        state_name (str): Workflow state name.
+        authorization (str): Linear API key.
+        cache (LinearMetadataCache): Defaults to the process wide cache.
+        client (LinearClient): Defaults to the process wide client.
+
+    Returns:
+        str: state ID or None.
+    """
+    if cache is None:
+        cache = get_default_metadata_cache()
+
+    def load_states():
+        result = execute_operation(
+            WORKFLOW_STATES_QUERY, {"teamId": team_id}, authorization, client=client
+        )
+        if result is None or "data" not in result:
+            return None
+        return {
+            state["name"]: state["id"]
+            for state in result["data"]["workflowStates"]["nodes"]
+        }
+
+    return cache.get_name(f"workflowStates:{team_id}", state_name, load_states)
+
+
+def find_todo_issue(team_id, authorization, batched=True, client=None):
+    """
+    Finds the next Todo issue of a team following TODO_PRIORITY_ORDER.
+
+    In batched mode all priorities are fetched with one `todo_issues_operation`,
+    otherwise one query is sent per priority. Issues are never cached,they are
+    moved,closed and reprioritised in Linear at any time.
+
+    Args:
+        team_id (str): Team ID.
+        authorization (str): Linear API key.
+        batched (bool): One query for all priorities.
+        client (LinearClient): Defaults to the process wide client.
+
+    Returns:
+        dict: issue or None.
+    """
+    if not batched:
+        for priority in TODO_PRIORITY_ORDER:
+            result = execute_operation(
+                todo_issues_operation((priority,)),
+                todo_issues_variables(team_id),
+                authorization,
+                True,
+                client,
+            )
+            issue = pick_todo_issue(result["data"]["team"], [priority])
+            if issue is not None:
+                return issue
+        return None
+
+    result = execute_operation(
+        todo_issues_operation(tuple(TODO_PRIORITY_ORDER)),
+        todo_issues_variables(team_id),
+        authorization,
+        True,
+        client,
+    )
+    if result is None or "data" not in result:
+        return None
+    return pick_todo_issue(result["data"]["team"], TODO_PRIORITY_ORDER)
+
+
+@functools.lru_cache(maxsize=256)
+def _batch_operation(shape):
+    definitions = []
+    fields = []
+    for index, (field, arguments, selection) in enumerate(shape):
+        alias = f"m{index}"
+        values = []
+        for name, graphql_type in arguments:
+            definitions.append(f"${alias}_{name}: {graphql_type}")
+            values.append(f"{name}: ${alias}_{name}")
+        fields.append(f"  {alias}: {field}({', '.join(values)}) {{ {selection} }}")
+    text = "mutation Batch(%s) {\n%s\n}" % (", ".join(definitions), "\n".join(fields))
+    # not registered,shapes are unbounded
+    return GraphQLOperation(f"MutationBatch{len(shape)}", text)
+
+
+MutationResult = namedtuple("MutationResult", ["data", "errors"])
+
+
+class MutationBatch:
+    """
+    Pending Linear mutations merged into one aliased GraphQL document.
+
+    Every mutation gets an alias(`m0`,`m1`...) and its arguments are sent as
+    variables,so values need no escaping and the whole batch costs one round trip.
+    `execute()` maps the response data and errors back to each alias.
+
+    Example:
+        batch = MutationBatch()
+        comment = batch.add_comment(issue_id, "advice")
+        update = batch.update_issue(issue_id, stateId=state_id)
+        results = batch.execute(api_key)
+        results[comment].errors
+    """
+
+    def __init__(self):
+        self._mutations = []  # (alias, field, {argument: (type, value)}, selection)
+
+    def __len__(self):
+        return len(self._mutations)
+
+    def add(self, field, arguments, selection="success"):
+        """
+        Adds a mutation.
+
+        Args:
+            field (str): Mutation field,e.g. "commentCreate".
+            arguments (dict): argument name -> (graphql type, value).
+            selection (str): Selection set of the payload.
+
+        Returns:
+            str: alias of the mutation.
+        """
+        alias = f"m{len(self._mutations)}"
+        self._mutations.append((alias, field, arguments, selection))
+        return alias
+
+    def add_comment(self, issue_id, body):
+        return self.add(
+            "commentCreate",
+            {"input": ("CommentCreateInput!", {"issueId": issue_id, "body": body})},
+            "success comment { id }",
+        )
+
+    def update_issue(self, issue_id, **input):
+        return self.add(
+            "issueUpdate",
+            {"id": ("String!", issue_id), "input": ("IssueUpdateInput!", input)},
+            "success issue { id state { id name } }",
+        )
+
+    def document(self):
+        """
+        Returns:
+            tuple: (GraphQLOperation, variables). The operation is built once per
+            shape(fields and argument types),only the variables change per call.
+        """
+        shape = tuple(
+            (
+                field,
+                tuple(
+                    (name, graphql_type)
+                    for name, (graphql_type, _) in arguments.items()
+                ),
+                selection,
+            )
+            for _, field, arguments, selection in self._mutations
+        )
+        variables = {
+            f"{alias}_{name}": value
+            for alias, _, arguments, _ in self._mutations
+            for name, (_, value) in arguments.items()
+        }
+        return _batch_operation(shape), variables
+
+    def execute(self, authorization, client=None):
+        """
+        Sends every pending mutation in one request and clears the batch.
+
+        Args:
+            authorization (str): Linear API key.
+            client (LinearClient): Defaults to the process wide client.
+
+        Returns:
+            dict: alias -> MutationResult(data,errors). Errors without a path
+            (request failure,validation) are given to every alias without data.
+        """
+        if not self._mutations:
+            return {}
+        operation, variables = self.document()
+        aliases = [mutation[0] for mutation in self._mutations]
+        self._mutations = []
+        result = execute_operation(operation, variables, authorization, client=client)
+        if result is None:
+            result = {"errors": [{"message": "request failed"}]}
+        data = result.get("data") or {}
+        errors = {alias: [] for alias in aliases}
+        batch_errors = []
+        for error in result.get("errors", []):
+            path = error.get("path") or []
+            if path and path[0] in errors:
+                errors[path[0]].append(error)
+            else:
+                batch_errors.append(error)
+        results = {}
+        for alias in aliases:
+            alias_errors = errors[alias]
+            if data.get(alias) is None and not alias_errors:
+                alias_errors = batch_errors
+            results[alias] = MutationResult(data.get(alias), alias_errors)
+        return results
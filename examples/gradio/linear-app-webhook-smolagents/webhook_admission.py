@@ -0,0 +1,117 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Admission control of webhook handlers,urgent Linear issues are admitted first."""
+
+import asyncio
+import heapq
+import itertools
+
+# Linear priority -> rank,lower is admitted first
+# urgent,high,medium,no priority,low
+PRIORITY_RANK = {1: 0, 2: 1, 3: 2, 0: 3, 4: 4}
+
+
+def priority_rank(priority):
+    return PRIORITY_RANK.get(priority, PRIORITY_RANK[0])
+
+
+class AdmissionController:
+    """
+    Limits the webhook handlers running at the same time.
+
+    Beyond `max_in_flight` requests wait in a priority queue(most urgent first,
+    then oldest). When the queue is full a more urgent request takes the place of
+    the least urgent waiting one,which is shed with 429. A request that cannot
+    be queued gets 503. Both carry `Retry-After`.
+
+    Runs on the server's event loop,no lock is needed.
+
+    Args:
+        max_in_flight (int): Handlers running at the same time.
+        max_queue (int): Requests waiting for a slot.
+        retry_after (int): Seconds sent in the Retry-After header.
+    """
+
+    def __init__(self, max_in_flight=8, max_queue=32, retry_after=5):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._waiting = []  # heap of [rank, sequence, future]
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.shed = 0
+        self.rejected = 0
+
+    async def acquire(self, priority=None):
+        """
+        Waits for a slot.
+
+        Args:
+            priority (int): Linear priority of the request.
+
+        Returns:
+            int: None once admitted(call `release()` when done),else the status code
+            to answer with(429 shed for a more urgent request,503 queue full).
+        """
+        rank = priority_rank(priority)
+        if self._in_flight < self.max_in_flight and not self._waiting:
+            self._in_flight += 1
+            self.admitted += 1
+            return None
+        if len(self._waiting) >= self.max_queue:
+            least_urgent = max(self._waiting, default=None)
+            if least_urgent is None or least_urgent[0] <= rank:
+                self.rejected += 1
+                return 503
+            self._waiting.remove(least_urgent)
+            heapq.heapify(self._waiting)
+            least_urgent[2].set_result(False)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._sequence), future]
+        heapq.heappush(self._waiting, entry)
+        try:
+            admitted = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.result():
+                self.release()  # admitted while being cancelled
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+        if not admitted:
+            self.shed += 1
+            return 429
+        self.admitted += 1
+        return None
+
+    def release(self):
+        """Gives the slot to the most urgent waiting request."""
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(True)  # the slot is handed over
+                return
+        self._in_flight -= 1
+
+    def metrics(self):
+        return {
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiting),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "rejected": self.rejected,
+        }
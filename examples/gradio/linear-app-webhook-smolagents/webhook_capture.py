@@ -0,0 +1,132 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Records verified webhook requests for debugging without blocking the handler."""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# never written to disk
+REDACTED_HEADERS = ("linear-signature", "authorization", "cookie")
+
+
+class WebhookCaptureRecorder:
+    """
+    Ring buffer of recent webhook requests flushed to a rotating JSON lines file.
+
+    `record()` only appends to memory,a background thread writes the file,so the
+    request never waits for disk. When requests come faster than the flusher the
+    oldest unwritten ones are dropped.
+
+    Args:
+        path (str): JSON lines file,rotated to `path.1`,`path.2`...
+        max_entries (int): Requests kept in memory before they are written.
+        max_body_bytes (int): Longer bodies are truncated.
+        max_file_bytes (int): The file is rotated above this size.
+        backup_count (int): Rotated files kept.
+        flush_interval (float): Seconds between flushes.
+    """
+
+    def __init__(
+        self,
+        path="webhook_capture.jsonl",
+        max_entries=100,
+        max_body_bytes=65536,
+        max_file_bytes=1024 * 1024,
+        backup_count=2,
+        flush_interval=1.0,
+    ):
+        self.path = path
+        self.max_body_bytes = max_body_bytes
+        self.max_file_bytes = max_file_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.recorded = 0
+        self.dropped = 0
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="webhook-capture", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, headers, body):
+        """
+        Queues one request.
+
+        Args:
+            headers: Request headers(dict-like).
+            body (bytes): Raw request body.
+        """
+        headers = {
+            key: value
+            for key, value in headers.items()
+            if key.lower() not in REDACTED_HEADERS
+        }
+        entry = {
+            "time": time.time(),
+            "headers": headers,
+            "body": body[: self.max_body_bytes].decode("utf-8", errors="replace"),
+            "truncated": len(body) > self.max_body_bytes,
+        }
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(entry)
+            self.recorded += 1
+
+    def flush(self):
+        with self._lock:
+            entries = list(self._buffer)
+            self._buffer.clear()
+        if not entries:
+            return
+        try:
+            self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"webhook capture failed:{e}")
+
+    def _rotate(self):
+        if not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self.max_file_bytes:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        """Writes the remaining requests and stops the flusher."""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
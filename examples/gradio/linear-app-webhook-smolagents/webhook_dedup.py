@@ -0,0 +1,180 @@
+# Copyright 2025-present, Akihito Miyazaki
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Idempotency store so retried or repeated webhooks do not re-run the agent."""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class WebhookDedupStore:
+    """
+    Remembers handled webhook events and recently handled issues.
+
+    - `seen_event()` drops replays: the same `webhookId` + `webhookTimestamp`, or the same
+      change of an entity(`data.id` + `data.updatedAt`) delivered again by a retry.
+    - `recently_handled()` coalesces repeated updates of the same `data.id` within
+      `coalesce_window` seconds,only the first one runs the agent.
+    - `forget_event()` and `forget_handled()` roll a key back when the agent job was
+      not accepted,so the retry of that delivery(or the next update) is not dropped.
+
+    Keys live in bounded LRU dicts. With `sqlite_path` they are also stored in SQLite,
+    so restarts(and other processes sharing the file) keep dropping duplicates.
+
+    Args:
+        max_entries (int): Keys kept in memory per kind.
+        coalesce_window (float): Seconds an issue stays handled.
+        event_ttl (float): Seconds an event key is remembered.
+        sqlite_path (str): Optional SQLite file.
+    """
+
+    def __init__(
+        self, max_entries=1024, coalesce_window=10, event_ttl=86400, sqlite_path=None
+    ):
+        self.max_entries = max_entries
+        self.coalesce_window = coalesce_window
+        self.event_ttl = event_ttl
+        self._events = OrderedDict()  # key -> seen_at
+        self._entities = OrderedDict()  # entity id -> handled_at
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path is not None:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, timeout=30)
+            # webhook worker processes share the file
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events (key TEXT PRIMARY KEY, seen_at REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entities (id TEXT PRIMARY KEY, handled_at REAL)"
+            )
+            self._db.commit()
+
+    def seen_event(
+        self, webhook_id, webhook_timestamp, entity_id=None, updated_at=None
+    ):
+        """
+        Records the event and returns True if it was already seen.
+        """
+        keys = self._event_keys(webhook_id, webhook_timestamp, entity_id, updated_at)
+        now = time.time()
+        with self._lock:
+            seen = False
+            for key in keys:
+                seen_at = self._events.get(key)
+                if seen_at is not None and now - seen_at < self.event_ttl:
+                    seen = True
+            if self._db is not None:
+                seen = self._db_seen_event(keys, now) or seen
+            for key in keys:
+                self._remember(self._events, key, now)
+        return seen
+
+    def recently_handled(self, entity_id):
+        """
+        Returns True if `entity_id` was handled within `coalesce_window`,
+        otherwise marks it handled now and returns False.
+        """
+        now = time.time()
+        with self._lock:
+            handled_at = self._entities.get(entity_id)
+            if handled_at is not None and now - handled_at < self.coalesce_window:
+                return True
+            if self._db is not None:
+                # one statement,so two processes cannot both mark it handled
+                cursor = self._db.execute(
+                    "INSERT INTO entities (id, handled_at) VALUES (?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET handled_at = excluded.handled_at"
+                    " WHERE entities.handled_at <= ?",
+                    (entity_id, now, now - self.coalesce_window),
+                )
+                self._db.commit()
+                if cursor.rowcount == 0:
+                    return True
+            self._remember(self._entities, entity_id, now)
+            return False
+
+    def handled_remaining(self, entity_id):
+        """
+        Seconds until the `coalesce_window` of `entity_id` ends,0 if it is not handled.
+        """
+        now = time.time()
+        with self._lock:
+            handled_at = self._entities.get(entity_id)
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT handled_at FROM entities WHERE id = ?", (entity_id,)
+                ).fetchone()
+                if row is not None:
+                    handled_at = max(handled_at or 0, row[0])
+        if handled_at is None:
+            return 0
+        return max(0, handled_at + self.coalesce_window - now)
+
+    def forget_event(
+        self, webhook_id, webhook_timestamp, entity_id=None, updated_at=None
+    ):
+        """
+        Removes an event recorded by `seen_event()`,its retry is handled again.
+        """
+        keys = self._event_keys(webhook_id, webhook_timestamp, entity_id, updated_at)
+        with self._lock:
+            for key in keys:
+                self._events.pop(key, None)
+            if self._db is not None:
+                self._db.executemany(
+                    "DELETE FROM events WHERE key = ?", [(key,) for key in keys]
+                )
+                self._db.commit()
+
+    def forget_handled(self, entity_id):
+        """
+        Removes the mark of `recently_handled()`,the next update runs the agent.
+        """
+        with self._lock:
+            self._entities.pop(entity_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM entities WHERE id = ?", (entity_id,))
+                self._db.commit()
+
+    def _event_keys(self, webhook_id, webhook_timestamp, entity_id, updated_at):
+        keys = [f"webhook:{webhook_id}:{webhook_timestamp}"]
+        if entity_id is not None and updated_at is not None:
+            keys.append(f"change:{entity_id}:{updated_at}")
+        return keys
+
+    def _remember(self, entries, key, now):
+        entries[key] = now
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _db_seen_event(self, keys, now):
+        seen = False
+        self._db.execute(
+            "DELETE FROM events WHERE seen_at < ?", (now - self.event_ttl,)
+        )
+        self._db.execute(
+            "DELETE FROM entities WHERE handled_at < ?", (now - self.coalesce_window,)
+        )
+        for key in keys:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO events (key, seen_at) VALUES (?, ?)", (key, now)
+            )
+            if cursor.rowcount == 0:
+                seen = True
+        self._db.commit()
+        return seen
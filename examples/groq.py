@@ -10,6 +10,9 @@ model = SleepPerLastTokenModelLiteLLM(
     model_id="groq/llama3-70b-8192",
     api_base="https://api.groq.com/openai/v1/",
     api_key=os.environ["GROQ_API_KEY"],
+    # limits of your plan,calls wait only when they would be exceeded
+    requests_per_minute=30,
+    tokens_per_minute=6000,
 )
 # model._flatten_messages_as_text = True
 agent = CodeAgent(tools=[], model=model)
@@ -0,0 +1,88 @@
+"""
+Simulated-clock harness for the RateLimiter in sleep_per_last_token_model.py.
+
+No model or api key is called. Each simulated call uses `--tokens` tokens and takes
+`--call-time` seconds. The old fixed sleep of (tokens * sleep_factor) seconds before
+every call is compared with the token-bucket limiter over the same workload.
+
+usage: python simulate_rate_limiter.py --calls 100 --tokens 400 --rpm 30 --tpm 6000
+"""
+
+import argparse
+
+from sleep_per_last_token_model import RateLimiter
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def simulate_fixed_sleep(calls, tokens, call_time, sleep_factor):
+    clock = SimulatedClock()
+    for i in range(calls):
+        if i > 0:  # the first call has no last token count
+            clock.sleep(tokens * sleep_factor)
+        clock.sleep(call_time)
+    return clock.now
+
+
+def simulate_token_bucket(calls, tokens, call_time, rpm, tpm):
+    clock = SimulatedClock()
+    limiter = RateLimiter(rpm, tpm, clock=clock, sleep=clock.sleep)
+    sent_at = []
+    for _ in range(calls):
+        clock.sleep(limiter.reserve(tokens))  # acquire() without the log line
+        sent_at.append(clock.now)
+        clock.sleep(call_time)
+    return clock.now, sent_at
+
+
+def max_in_window(sent_at, window=60.0):
+    best = 0
+    start = 0
+    for end in range(len(sent_at)):
+        while sent_at[end] - sent_at[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--call-time", type=float, default=1.0)
+    parser.add_argument("--sleep-factor", type=float, default=0.01)
+    parser.add_argument("--rpm", type=float, default=30)
+    parser.add_argument("--tpm", type=float, default=6000)
+    args = parser.parse_args()
+
+    fixed = simulate_fixed_sleep(
+        args.calls, args.tokens, args.call_time, args.sleep_factor
+    )
+    bucket, sent_at = simulate_token_bucket(
+        args.calls, args.tokens, args.call_time, args.rpm, args.tpm
+    )
+    busiest = max_in_window(sent_at)
+    print(f"fixed sleep : {fixed:9.1f} s  {args.calls / fixed * 60:7.2f} calls/min")
+    print(f"token bucket: {bucket:9.1f} s  {args.calls / bucket * 60:7.2f} calls/min")
+    print(
+        f"busiest minute: {busiest} calls, {busiest * args.tokens} tokens"
+        f" (limit {args.rpm:.0f} calls, {args.tpm:.0f} tokens)"
+    )
+    # fails when the limiter lets a minute exceed the provider limits
+    assert busiest <= args.rpm, f"{busiest} calls in a minute,limit {args.rpm}"
+    assert (
+        busiest * args.tokens <= args.tpm
+    ), f"{busiest * args.tokens} tokens in a minute,limit {args.tpm}"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,345 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
 import time
+from collections import OrderedDict
 from typing import List, Optional, Dict
 
 from smolagents import OpenAIServerModel, LiteLLMModel, ChatMessage, Tool
 
 
+class TokenBucket:
+    """
+    Token bucket allowing at most `limit` per any `period` seconds.
+
+    The bucket holds up to `burst` of the limit and refills with the rest over `period`,
+    so a burst plus a full period of refill never exceeds `limit`. A bucket starting
+    full at `limit` would allow twice the provider's budget in the first period.
+
+    `reserve()` takes the amount at once and may leave the bucket negative,
+    the returned delay is how long the caller has to wait for the debt to refill.
+    """
+
+    def __init__(
+        self, limit: float, period: float = 60.0, burst: float = 0.1, now: float = 0.0
+    ):
+        self.limit = limit
+        self.capacity = limit * burst
+        self.rate = (limit - self.capacity) / period
+        self.tokens = self.capacity
+        self.updated_at = now
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.tokens -= min(amount, self.limit)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, amount: float, now: float):
+        """Give back(amount < 0) or take more(amount > 0) after the real usage is known."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter built on two token buckets.
+
+    Calls only wait when the budget would be exceeded. Thread safe,
+    `acquire()` blocks until the call can be sent.
+    `clock` and `sleep` can be replaced by a simulated clock.
+
+    The buckets are synced with the provider's rate limit headers(`update_from_headers`)
+    and calls are paused after a 429(`backoff`),so throughput follows the real limit.
+
+    `burst` is the share of the per minute limit that can be sent at once,
+    the rest is paced over the minute.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 6000,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        burst: float = 0.1,
+    ):
+        self.clock = clock
+        self.sleep = sleep
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, burst=burst, now=now)
+        self.tokens = TokenBucket(tokens_per_minute, burst=burst, now=now)
+        self.blocked_until = now
+        self.consecutive_rate_limits = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserves one request and `tokens` tokens,returns seconds to wait before sending."""
+        with self._lock:
+            now = self.clock()
+            return max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.blocked_until - now,
+            )
+
+    def update_from_headers(self, headers: Dict[str, str]):
+        """
+        Syncs the buckets with x-ratelimit-remaining-* / x-ratelimit-reset-* headers.
+        The provider's remaining budget wins over the local estimate,
+        an exhausted budget blocks until its reset.
+        """
+        headers = normalize_rate_limit_headers(headers)
+        with self._lock:
+            now = self.clock()
+            self.consecutive_rate_limits = 0
+            for name, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket._refill(now)
+                bucket.tokens = min(bucket.tokens, remaining)
+                reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{name}"))
+                if remaining <= 0 and reset is not None:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+    def backoff(self, headers: Optional[Dict[str, str]] = None) -> float:
+        """
+        Pauses every call after a 429,for `retry-after` if sent,
+        otherwise for an exponential backoff. Returns the pause in seconds.
+        """
+        headers = normalize_rate_limit_headers(headers or {})
+        with self._lock:
+            now = self.clock()
+            self.consecutive_rate_limits += 1
+            delay = parse_reset_duration(headers.get("retry-after"))
+            if delay is None:
+                delay = min(
+                    self.max_backoff,
+                    self.base_backoff * 2 ** (self.consecutive_rate_limits - 1),
+                )
+            self.blocked_until = max(self.blocked_until, now + delay)
+            return delay
+
+    def acquire(self, tokens: int) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            print(f"Rate limit: sleeping for {delay:.2f} seconds...")
+            self.sleep(delay)
+        return delay
+
+    def record_usage(self, estimated_tokens: int, used_tokens: int):
+        """Corrects the token bucket with the real usage of a call."""
+        with self._lock:
+            self.tokens.adjust(used_tokens - estimated_tokens, self.clock())
+
+
+def normalize_rate_limit_headers(headers) -> Dict[str, str]:
+    # litellm also forwards them as llm_provider-<header>
+    normalized = {}
+    for key, value in dict(headers).items():
+        key = key.lower()
+        if key.startswith("llm_provider-"):
+            key = key[len("llm_provider-") :]
+        normalized[key] = value
+    return normalized
+
+
+_DURATION_PART = re.compile(r"([0-9.]+)(ms|h|m|s)")
+
+
+def parse_reset_duration(value) -> Optional[float]:
+    """Parses reset durations like "2m59.56s", "7.66s", "120ms" or plain seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def get_response_headers(response) -> Dict[str, str]:
+    """Rate limit headers of a litellm response."""
+    hidden_params = getattr(response, "_hidden_params", None) or {}
+    return hidden_params.get("additional_headers") or {}
+
+
+def get_error_headers(error) -> Dict[str, str]:
+    """Headers of a litellm error(e.g. RateLimitError),empty if none."""
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers:
+        return dict(headers)
+    response = getattr(error, "response", None)
+    return dict(getattr(response, "headers", None) or {})
+
+
+def is_rate_limit_error(error) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+_shared_rate_limiters: Dict[str, RateLimiter] = {}
+_shared_rate_limiters_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(
+    key: str, requests_per_minute: float = 30, tokens_per_minute: float = 6000
+) -> RateLimiter:
+    """
+    Returns the process wide RateLimiter for `key`(e.g. model_id),
+    provider limits are per model,not per model instance.
+    """
+    with _shared_rate_limiters_lock:
+        limiter = _shared_rate_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _shared_rate_limiters[key] = limiter
+        return limiter
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int]) -> int:
+    # roughly 4 characters per token,corrected by record_usage after the call
+    return len(str(messages)) // 4 + (max_tokens or 0)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model responses with LRU + TTL eviction.
+
+    Keys are sha256 hashes of the request(`make_key`),values are the
+    `ChatMessage.model_dump_json()` of the response. With `sqlite_path` the entries
+    are also stored in SQLite,so restarts and other processes share them.
+
+    Args:
+        max_entries (int): Responses kept in memory.
+        ttl (float): Seconds a response stays valid.
+        sqlite_path (str): Optional SQLite file.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600, sqlite_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, message json)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if sqlite_path is not None:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses"
+                " (key TEXT PRIMARY KEY, expires_at REAL, message TEXT)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model_id, messages, stop_sequences, temperature, max_tokens, **extra):
+        request = {
+            "model_id": model_id,
+            "messages": messages,
+            "stop_sequences": stop_sequences,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **extra,
+        }
+        text = json.dumps(request, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key) -> Optional[ChatMessage]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._db.execute(
+                    "SELECT expires_at, message FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if entry is None or entry[0] < now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+            self.hits += 1
+        return ChatMessage.from_dict(json.loads(entry[1]))
+
+    def set(self, key, message: ChatMessage):
+        entry = (time.time() + self.ttl, message.model_dump_json())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, message)"
+                    " VALUES (?, ?, ?)",
+                    (key, *entry),
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE expires_at < ?", (time.time(),)
+                )
+                self._db.commit()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
 class SleepPerLastTokenModelLiteLLM(LiteLLMModel):
-    def __init__(self, sleep_factor: float = 0.01, **kwargs):
+    """
+    LiteLLMModel that waits only when the provider's requests/tokens per minute budget would be exceeded.
+
+    The limiter is shared by every instance with the same `model_id`, it follows the
+    provider's rate limit headers and a 429 is retried up to `max_rate_limit_retries`
+    times after `retry-after` or an adaptive backoff.
+    The limits default to 30 requests and 6000 tokens per minute(a Groq free tier),
+    pass `requests_per_minute` and `tokens_per_minute` of your model and plan.
+    With a `response_cache`, an identical request(messages, stop sequences, model_id,
+    temperature, max_tokens) is answered from the cache without calling or waiting.
+    Passing `sleep_factor` restores the old fixed sleep of
+    (last input + output tokens) * sleep_factor seconds before each call.
+    """
+
+    def __init__(
+        self,
+        sleep_factor: Optional[float] = None,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 6000,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_rate_limit_retries: int = 3,
+        response_cache: Optional[ResponseCache] = None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self.sleep_factor = sleep_factor
+        self.response_cache = response_cache
+        self.max_rate_limit_retries = max_rate_limit_retries
+        if rate_limiter is None:
+            rate_limiter = get_shared_rate_limiter(
+                self.model_id, requests_per_minute, tokens_per_minute
+            )
+        self.rate_limiter = rate_limiter
 
     def __call__(
         self,
@@ -17,16 +349,78 @@ class SleepPerLastTokenModelLiteLLM(LiteLLMModel):
         tools_to_call_from: Optional[List[Tool]] = None,
         **kwargs,
     ) -> ChatMessage:
-        if self.last_input_token_count is not None:
-            sleep_time = (
-                self.last_input_token_count + self.last_output_token_count
-            ) * self.sleep_factor
-            print(f"Sleeping for {sleep_time:.2f} seconds...")
-            time.sleep(sleep_time)
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(
+                self.model_id,
+                messages,
+                stop_sequences,
+                kwargs.get("temperature", self.kwargs.get("temperature")),
+                kwargs.get("max_tokens", self.kwargs.get("max_tokens")),
+                grammar=grammar,
+                tools=[tool.name for tool in tools_to_call_from or []],
+            )
+            message = self.response_cache.get(cache_key)
+            if message is not None:
+                print("Response cache hit,skipped the model call")
+                self.last_input_token_count = 0
+                self.last_output_token_count = 0
+                return message
 
-        return super().__call__(
+        message = self._call_model(
             messages, stop_sequences, grammar, tools_to_call_from, **kwargs
         )
+        if cache_key is not None:
+            self.response_cache.set(cache_key, message)
+        return message
+
+    def _call_model(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        if self.sleep_factor is not None:
+            if self.last_input_token_count is not None:
+                sleep_time = (
+                    self.last_input_token_count + self.last_output_token_count
+                ) * self.sleep_factor
+                print(f"Sleeping for {sleep_time:.2f} seconds...")
+                time.sleep(sleep_time)
+
+            return super().__call__(
+                messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+            )
+
+        estimated_tokens = estimate_tokens(
+            messages,
+            kwargs.get("max_tokens", self.kwargs.get("max_tokens")),
+        )
+        for retry in range(self.max_rate_limit_retries + 1):
+            self.rate_limiter.acquire(estimated_tokens)
+            try:
+                result = super().__call__(
+                    messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+                )
+                break
+            except Exception as e:
+                if not is_rate_limit_error(e) or retry == self.max_rate_limit_retries:
+                    raise
+                # rejected calls use no tokens
+                self.rate_limiter.record_usage(estimated_tokens, 0)
+                delay = self.rate_limiter.backoff(get_error_headers(e))
+                print(f"Rate limited(429),retrying in {delay:.2f} seconds...")
+
+        if self.last_input_token_count is not None:
+            self.rate_limiter.record_usage(
+                estimated_tokens,
+                self.last_input_token_count + (self.last_output_token_count or 0),
+            )
+        # after record_usage,the provider's remaining budget already includes this call
+        self.rate_limiter.update_from_headers(get_response_headers(result.raw))
+        return result
 
 
 # smolagents 1.9.2 not working